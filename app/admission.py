@@ -0,0 +1,171 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from . import metrics
+from .database import DB_POOL_SIZE, DB_MAX_OVERFLOW
+
+# Admission control for the analytics routes (stats, winrate, trend, matchups, metagame,
+# batch stats).
+#
+# Each route has its own concurrency limit, and all analytics requests together may hold at
+# most the pool's connections minus DB_WRITE_RESERVE, so heavy analytics can't starve
+# POST /match of connections. The reserve only holds against these routes: other reads (match
+# lists, exports, lookups) aren't metered and can still take those connections. A request that can't start waits in a bounded queue. When the queue is full,
+# or the wait exceeds ANALYTICS_QUEUE_TIMEOUT, it is shed with AnalyticsBusy (503 +
+# Retry-After) instead of piling up on the pool. Optional per-client token buckets
+# (ANALYTICS_RATE_LIMIT requests/s, ANALYTICS_RATE_BURST) answer 429 when a client runs dry.
+
+ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "true").lower() in ("1", "true", "yes")
+DB_WRITE_RESERVE = int(os.getenv("DB_WRITE_RESERVE", "2"))
+ANALYTICS_CONCURRENCY = int(os.getenv("ANALYTICS_CONCURRENCY", str(max(1, DB_POOL_SIZE + DB_MAX_OVERFLOW - DB_WRITE_RESERVE))))
+ANALYTICS_ROUTE_CONCURRENCY = int(os.getenv("ANALYTICS_ROUTE_CONCURRENCY", str(ANALYTICS_CONCURRENCY)))
+# per-route overrides, e.g. "winrate=4,metagame=2"
+ANALYTICS_ROUTE_LIMITS = os.getenv("ANALYTICS_ROUTE_LIMITS", "")
+ANALYTICS_MAX_QUEUE = int(os.getenv("ANALYTICS_MAX_QUEUE", "100"))
+ANALYTICS_QUEUE_TIMEOUT = float(os.getenv("ANALYTICS_QUEUE_TIMEOUT", "2.0"))
+ANALYTICS_RATE_LIMIT = float(os.getenv("ANALYTICS_RATE_LIMIT", "0"))  # 0 disables
+ANALYTICS_RATE_BURST = float(os.getenv("ANALYTICS_RATE_BURST", "20"))
+ANALYTICS_RATE_MAX_CLIENTS = int(os.getenv("ANALYTICS_RATE_MAX_CLIENTS", "10000"))
+
+
+class AnalyticsBusy(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(retry_after)
+        self.retry_after = retry_after
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(retry_after)
+        self.retry_after = retry_after
+
+
+class Limiter:
+    # a semaphore whose waiters are counted, so the queue can be bounded
+    def __init__(self, limit: int, max_queue: int):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.waiting = 0
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def acquire(self, timeout: float) -> bool:
+        if self._slots is None:
+            # created lazily so the semaphore belongs to the running loop
+            self._slots = asyncio.Semaphore(self.limit)
+        if not self._slots.locked():
+            await self._slots.acquire()  # a free slot: no wait
+            self.in_flight += 1
+            return True
+        if self.waiting >= self.max_queue:
+            return False
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        return True
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._slots.release()
+
+
+def _route_limits(spec: str) -> Dict[str, int]:
+    limits = {}
+    for part in spec.split(","):
+        if part.strip():
+            name, _, n = part.partition("=")
+            limits[name.strip()] = int(n)
+    return limits
+
+
+_overrides = _route_limits(ANALYTICS_ROUTE_LIMITS)
+_global = Limiter(ANALYTICS_CONCURRENCY, ANALYTICS_MAX_QUEUE)
+_routes: Dict[str, Limiter] = {}
+
+
+def route_limiter(route: str) -> Limiter:
+    if route not in _routes:
+        _routes[route] = Limiter(_overrides.get(route, ANALYTICS_ROUTE_CONCURRENCY), ANALYTICS_MAX_QUEUE)
+    return _routes[route]
+
+
+class Slot:
+    def __init__(self, limiters):
+        self.limiters = limiters
+
+    def release(self) -> None:
+        for limiter in reversed(self.limiters):
+            limiter.release()
+
+
+async def acquire(route: str) -> Slot:
+    # the route's slot first, then a global one; both within one ANALYTICS_QUEUE_TIMEOUT
+    retry_after = max(1, math.ceil(ANALYTICS_QUEUE_TIMEOUT))
+    if not ADMISSION_CONTROL:
+        return Slot([])
+    queued = time.perf_counter()
+    deadline = queued + ANALYTICS_QUEUE_TIMEOUT
+    held = []
+    for limiter, scope in ((route_limiter(route), "route"), (_global, "global")):
+        if not await limiter.acquire(max(0.0, deadline - time.perf_counter())):
+            Slot(held).release()
+            metrics.ADMISSION_REJECTED.inc(route=route, reason=f"{scope}_busy")
+            raise AnalyticsBusy(retry_after)
+        held.append(limiter)
+    metrics.ADMISSION_WAIT.observe(time.perf_counter() - queued, route=route)
+    return Slot(held)
+
+
+class TokenBuckets:
+    # per-client buckets, least recently seen clients dropped beyond max_clients
+    def __init__(self, rate: float, burst: float, max_clients: int):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def take(self, client: str) -> float:
+        # 0 when a token was taken, otherwise seconds until the next one
+        now = time.monotonic()
+        tokens, last = self._buckets.pop(client, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate
+        self._buckets[client] = (tokens, now)
+        while len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+rate_limits = TokenBuckets(ANALYTICS_RATE_LIMIT, ANALYTICS_RATE_BURST, ANALYTICS_RATE_MAX_CLIENTS) if ANALYTICS_RATE_LIMIT > 0 else None
+
+
+def check_rate(client: str, route: str) -> None:
+    if rate_limits is None:
+        return
+    wait = rate_limits.take(client)
+    if wait > 0:
+        metrics.ADMISSION_REJECTED.inc(route=route, reason="rate_limited")
+        raise RateLimited(max(1, math.ceil(wait)))
+
+
+def observe() -> None:
+    metrics.ADMISSION_IN_FLIGHT.set(_global.in_flight, route="all")
+    metrics.ADMISSION_QUEUED.set(_global.waiting, route="all")
+    for route, limiter in _routes.items():
+        metrics.ADMISSION_IN_FLIGHT.set(limiter.in_flight, route=route)
+        metrics.ADMISSION_QUEUED.set(limiter.waiting, route=route)
+
+
+metrics.registry.add_collector(observe)
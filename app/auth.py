@@ -1,14 +1,24 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+import asyncio
 import os
+import time
 from typing import Optional
 import bcrypt
 import jwt
 import hashlib
+from . import metrics
 
 SECRET_KEY = os.getenv("SECRET_KEY", "09d25e094faa6ca2556c818166b7a9563b93f7099f6f0f4caa6cf63b88e8d3e7")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7 # 7 days defaults
 
+# bcrypt runs in a dedicated thread pool (it releases the GIL) so it never blocks the event loop.
+# At most PASSWORD_HASH_WORKERS hashes run at once; a caller that can't get a slot within
+# PASSWORD_HASH_QUEUE_TIMEOUT seconds gets PasswordHasherBusy. 0 workers hashes inline (old behaviour).
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_QUEUE_TIMEOUT = float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT", "2.0"))
+
 def _pre_hash(password: str) -> str:
     # Bcrypt limits passwords to 72 bytes. 
     # Pre-hashing with SHA256 lets us support arbitrarily long passwords securely.
@@ -32,3 +42,42 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+_hash_executor: Optional[ThreadPoolExecutor] = None
+_hash_slots: Optional[asyncio.Semaphore] = None
+
+async def _run_hasher(op: str, fn, *args):
+    global _hash_executor, _hash_slots
+    if PASSWORD_HASH_WORKERS <= 0:
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            metrics.PASSWORD_HASH.observe(time.perf_counter() - start, op=op)
+    if _hash_executor is None:
+        # created lazily so the semaphore belongs to the running loop
+        _hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+        _hash_slots = asyncio.Semaphore(PASSWORD_HASH_WORKERS)
+    queued = time.perf_counter()
+    try:
+        await asyncio.wait_for(_hash_slots.acquire(), timeout=PASSWORD_HASH_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        metrics.PASSWORD_HASH_REJECTED.inc(op=op)
+        raise PasswordHasherBusy()
+    start = time.perf_counter()
+    metrics.PASSWORD_HASH_WAIT.observe(start - queued, op=op)
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, fn, *args)
+    finally:
+        _hash_slots.release()
+        metrics.PASSWORD_HASH.observe(time.perf_counter() - start, op=op)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_hasher("verify", verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run_hasher("hash", get_password_hash, password)
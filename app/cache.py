@@ -0,0 +1,201 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+# In-process caches. Everything here runs on the event loop thread, so no locking.
+
+_MISSING = object()
+
+
+# Bounded LRU cache whose entries also expire after `ttl` seconds
+class TTLCache:
+    def __init__(self, maxsize: int = 1024, ttl: float = 30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.get(key, _MISSING)
+        if item is _MISSING:
+            self.misses += 1
+            return default
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def pop_where(self, predicate) -> int:
+        # drop every entry whose value matches; O(size), meant for rare invalidations
+        stale = [k for k, (_, value) in self._data.items() if predicate(value)]
+        for k in stale:
+            del self._data[k]
+        return len(stale)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+# Per-deck results keyed by (kind, deck id, deck version, params).
+# crud.create_match bumps the deck's version after commit, so entries computed
+# before the write can no longer be looked up.
+class StatsCache:
+    def __init__(self, maxsize: int = 1024, ttl: float = 30.0):
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._versions: Dict[str, int] = {}
+        # bumped with every deck; keys results that span many decks
+        self.data_version = 0
+        # per-format versions key results that span one format; decks map to their
+        # format through a memo (a deck's format never changes)
+        self._deck_formats: Dict[str, Optional[str]] = {}
+        self._format_versions: Dict[Optional[str], int] = {}
+        # bumps of decks whose format isn't known; they invalidate every format
+        self._unknown_format_bumps = 0
+        # bump_all: part of every key
+        self._epoch = 0
+
+    def deck_version(self, deck_id: str) -> int:
+        return self._versions.get(deck_id, 0)
+
+    def bump_deck(self, deck_id: str) -> None:
+        self._versions[deck_id] = self._versions.get(deck_id, 0) + 1
+        self.data_version += 1
+        if deck_id in self._deck_formats:
+            fmt = self._deck_formats[deck_id]
+            self._format_versions[fmt] = self._format_versions.get(fmt, 0) + 1
+        else:
+            self._unknown_format_bumps += 1
+
+    def bump_all(self) -> None:
+        # after writes that may touch any deck (rollup rebuilds, decklist dedupe) or
+        # missed cache_bus events
+        self._epoch += 1
+        self.data_version += 1
+        self._unknown_format_bumps += 1
+        self.entries.clear()
+
+    def knows_deck(self, deck_id: str) -> bool:
+        return deck_id in self._deck_formats
+
+    def set_deck_format(self, deck_id: str, format: Optional[str]) -> None:
+        self._deck_formats[deck_id] = format
+
+    def format_version(self, format: Optional[str]) -> Tuple[int, int]:
+        return self._format_versions.get(format, 0), self._unknown_format_bumps
+
+    # take the key before reading the database, so a write that lands mid-request
+    # leaves the result filed under the old version
+    def key(self, kind: str, deck_id: str, params: Optional[Dict[str, Any]] = None) -> Hashable:
+        return (kind, deck_id, self._epoch, self.deck_version(deck_id), tuple(sorted((params or {}).items())))
+
+    def get(self, key: Hashable) -> Any:
+        return self.entries.get(key)
+
+    @property
+    def ttl(self) -> float:
+        return self.entries.ttl
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        self.entries.set(key, value, ttl=ttl)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.entries.stats(), "tracked_decks": len(self._versions), "known_deck_formats": len(self._deck_formats)}
+
+
+# Authenticated principal per bearer token, so protected endpoints skip the user lookup.
+# An entry never outlives the token's `exp`.
+class PrincipalCache:
+    def __init__(self, maxsize: int = 10000, ttl: float = 300.0):
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, token: str) -> Any:
+        return self.entries.get(token)
+
+    def set(self, token: str, principal: Any, expires_at: Optional[float] = None) -> None:
+        ttl = self.entries.ttl
+        if expires_at is not None:
+            ttl = min(ttl, expires_at - time.time())
+        self.entries.set(token, principal, ttl=ttl)
+
+    def invalidate_user(self, email: str) -> int:
+        # call whenever a user's record changes
+        return self.entries.pop_where(lambda p: p.email == email)
+
+    def stats(self) -> Dict[str, Any]:
+        return self.entries.stats()
+
+
+stats_cache = StatsCache(
+    maxsize=int(os.getenv("STATS_CACHE_MAXSIZE", "1024")),
+    ttl=float(os.getenv("STATS_CACHE_TTL", "30")),
+)
+
+
+# cross-deck aggregates (matchup matrix, metagame); keys include stats_cache.data_version
+# or stats_cache.format_version
+aggregate_cache = TTLCache(
+    maxsize=int(os.getenv("AGGREGATE_CACHE_MAXSIZE", "256")),
+    ttl=float(os.getenv("AGGREGATE_CACHE_TTL", "60")),
+)
+
+# (platform, username) -> player id, or None for names known not to resolve; crud.create_player
+# drops the new player's names, other workers pick them up through cache_bus or within the TTL
+player_name_cache = TTLCache(
+    maxsize=int(os.getenv("PLAYER_NAME_CACHE_MAXSIZE", "50000")),
+    ttl=float(os.getenv("PLAYER_NAME_CACHE_TTL", "300")),
+)
+
+principal_cache = PrincipalCache(
+    maxsize=int(os.getenv("PRINCIPAL_CACHE_MAXSIZE", "10000")),
+    ttl=float(os.getenv("PRINCIPAL_CACHE_TTL", "300")),
+)
+
+
+def normalize_play_draw(play_draw: Optional[str]) -> Optional[str]:
+    # same interpretation as crud.winrate_filters
+    if not play_draw:
+        return None
+    v = play_draw.lower()
+    if v.startswith("p"):
+        return "play"
+    if v.startswith("d"):
+        return "draw"
+    return "neither"
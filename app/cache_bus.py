@@ -0,0 +1,152 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+from typing import Any, Iterable, List, Optional
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import metrics
+from .cache import stats_cache, principal_cache, player_name_cache
+
+# Cross-worker cache invalidation over PostgreSQL LISTEN/NOTIFY (CACHE_BUS=1).
+#
+# crud publishes an event with pg_notify inside the write transaction, so it is delivered
+# only if, and right after, the transaction commits. Every worker holds one dedicated asyncpg
+# connection LISTENing on CACHE_BUS_CHANNEL and applies other workers' events to its local
+# caches; its own writes were already applied in-process. If the listener connection drops,
+# notifications sent meanwhile are lost, so the worker drops all stats after reconnecting.
+#
+# Events (payload {"origin", "kind", "values"}):
+#   decks         deck ids with new matches       stats_cache.bump_deck
+#   deck_formats  [deck id, format] of new decks  stats_cache.set_deck_format
+#   player_names  [platform, name] of new players player_name_cache.pop
+#   users         emails of new/changed users     principal_cache.invalidate_user
+#   all           rollup rebuild, decklist dedupe, stats_cache.bump_all
+#                 card backfill
+
+CACHE_BUS = os.getenv("CACHE_BUS", "false").lower() in ("1", "true", "yes")
+CACHE_BUS_CHANNEL = os.getenv("CACHE_BUS_CHANNEL", "cache_invalidation")
+CACHE_BUS_RECONNECT_DELAY = float(os.getenv("CACHE_BUS_RECONNECT_DELAY", "1.0"))
+CACHE_BUS_PING_INTERVAL = float(os.getenv("CACHE_BUS_PING_INTERVAL", "30"))
+# NOTIFY payloads must stay under 8000 bytes; larger value lists go out in chunks
+_MAX_PAYLOAD = 7000
+
+ORIGIN = f"{socket.gethostname()}:{os.getpid()}"
+
+logger = logging.getLogger("app.cache_bus")
+
+
+def _payloads(kind: str, values: List[Any]) -> List[str]:
+    payloads, chunk = [], []
+    for v in values:
+        chunk.append(v)
+        if len(json.dumps(chunk)) > _MAX_PAYLOAD - 200 and len(chunk) > 1:
+            payloads.append(json.dumps({"origin": ORIGIN, "kind": kind, "values": chunk[:-1]}))
+            chunk = [v]
+    payloads.append(json.dumps({"origin": ORIGIN, "kind": kind, "values": chunk}))
+    return payloads
+
+
+async def publish(db: AsyncSession, kind: str, values: Iterable[Any] = ()) -> None:
+    # call before db.commit(); a rolled-back transaction sends nothing
+    if not CACHE_BUS:
+        return
+    values = list(values)
+    if not values and kind != "all":
+        return
+    for payload in _payloads(kind, values):
+        await db.execute(select(func.pg_notify(CACHE_BUS_CHANNEL, payload)))
+
+
+def apply_event(kind: str, values: List[Any]) -> None:
+    if kind == "decks":
+        for deck_id in values:
+            stats_cache.bump_deck(deck_id)
+    elif kind == "deck_formats":
+        for deck_id, format in values:
+            stats_cache.set_deck_format(deck_id, format)
+    elif kind == "player_names":
+        for platform, name in values:
+            player_name_cache.pop((platform, name))
+    elif kind == "users":
+        for email in values:
+            principal_cache.invalidate_user(email)
+    elif kind == "all":
+        stats_cache.bump_all()
+    else:
+        logger.warning("unknown cache_bus event %r", kind)
+
+
+def _on_notify(conn, pid, channel, payload) -> None:
+    try:
+        event = json.loads(payload)
+    except ValueError:
+        logger.warning("malformed cache_bus payload %r", payload[:200])
+        return
+    if event.get("origin") == ORIGIN:
+        return
+    metrics.CACHE_BUS_EVENTS.inc(kind=event.get("kind"))
+    apply_event(event.get("kind"), event.get("values") or [])
+
+
+class CacheBusListener:
+    def __init__(self, dsn: str, channel: str):
+        self.dsn = dsn
+        self.channel = channel
+        self._task: Optional[asyncio.Task] = None
+        self._connected = asyncio.Event()
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+        # don't serve requests before the first LISTEN is in place (or has failed once)
+        await self._connected.wait()
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        import asyncpg
+
+        missed = False
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(self.dsn)
+                await conn.add_listener(self.channel, _on_notify)
+                if missed:
+                    # events sent while disconnected are gone
+                    metrics.CACHE_BUS_RECONNECTS.inc()
+                    stats_cache.bump_all()
+                self._connected.set()
+                lost = asyncio.Event()
+                conn.add_termination_listener(lambda c: lost.set())
+                while not lost.is_set():
+                    try:
+                        await asyncio.wait_for(lost.wait(), CACHE_BUS_PING_INTERVAL)
+                    except asyncio.TimeoutError:
+                        # a silently dropped connection only shows up on use
+                        await conn.execute("SELECT 1", timeout=CACHE_BUS_PING_INTERVAL)
+                logger.warning("cache_bus listener connection lost, reconnecting")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("cache_bus listener failed (%s), retrying in %.1fs", e, CACHE_BUS_RECONNECT_DELAY)
+                # a worker that can't listen still serves requests
+                self._connected.set()
+            finally:
+                if conn is not None and not conn.is_closed():
+                    conn.terminate()
+            missed = True
+            await asyncio.sleep(CACHE_BUS_RECONNECT_DELAY)
+
+
+def listener_dsn(url) -> str:
+    # the engine URL without the SQLAlchemy driver suffix, for asyncpg.connect
+    return url.set(drivername="postgresql").render_as_string(hide_password=False)
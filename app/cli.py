@@ -0,0 +1,70 @@
+import argparse
+import asyncio
+from .database import AsyncSessionLocal, engine
+from . import crud
+
+# Maintenance commands, e.g.:
+#   python -m app.cli rebuild-rollups
+#   python -m app.cli rebuild-rollups --deck-id <uuid> --check
+#   python -m app.cli backfill-cards
+#   python -m app.cli dedupe-decklists --dry-run
+
+async def rebuild_rollups(args):
+    async with AsyncSessionLocal() as db:
+        if args.check:
+            mismatched = await crud.check_deck_stats_rollup(db, args.deck_id)
+            for deck_id in mismatched:
+                print(f"rollup mismatch: {deck_id}")
+            print(f"{len(mismatched)} deck(s) out of sync")
+            return 1 if mismatched else 0
+        n = await crud.rebuild_deck_stats_rollup(db, args.deck_id)
+        print(f"rebuilt stats rollup for {n} deck(s)")
+        return 0
+
+async def backfill_cards(args):
+    async with AsyncSessionLocal() as db:
+        n = await crud.backfill_decklist_cards(db, batch_size=args.batch_size)
+        print(f"indexed cards for {n} decklist(s)")
+        return 0
+
+async def dedupe_decklists(args):
+    async with AsyncSessionLocal() as db:
+        summary = await crud.dedupe_decklists(db, dry_run=args.dry_run)
+        verb = "would remove" if args.dry_run else "removed"
+        print(f"{summary['decklists']} decklist(s), {verb} {summary['duplicates']} duplicate(s), {summary['rewritten']} rewritten in canonical form")
+        return 0
+
+COMMANDS = {
+    "rebuild-rollups": rebuild_rollups,
+    "backfill-cards": backfill_cards,
+    "dedupe-decklists": dedupe_decklists,
+}
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("rebuild-rollups", help="recompute deck_stats_rollup from matches")
+    p.add_argument("--deck-id", default=None, help="only this deck (default: all decks)")
+    p.add_argument("--check", action="store_true", help="report decks whose rollup is out of sync, without writing")
+
+    p = sub.add_parser("backfill-cards", help="rebuild cards / decklist_cards from decklist JSON")
+    p.add_argument("--batch-size", type=int, default=500, help="decklists per transaction")
+
+    p = sub.add_parser("dedupe-decklists", help="collapse identical decklists and repoint their matches")
+    p.add_argument("--dry-run", action="store_true", help="only count duplicates")
+
+    return parser
+
+async def _run(args) -> int:
+    try:
+        return await COMMANDS[args.command](args)
+    finally:
+        await engine.dispose()
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    return asyncio.run(_run(args))
+
+if __name__ == "__main__":
+    raise SystemExit(main())
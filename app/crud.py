@@ -1,8 +1,15 @@
-from sqlalchemy import select, func, and_
+from sqlalchemy import select, func, and_, or_, not_, exists, literal, any_, tuple_, bindparam, String, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert, ARRAY
+from sqlalchemy.orm import aliased
 from sqlalchemy.ext.asyncio import AsyncSession
 from . import models, schemas
-from typing import Optional, List, Dict, Any
+from .cache import stats_cache, principal_cache, player_name_cache
+from . import stats_engine, cache_bus
+from .metrics import STATS_COMPUTE
+from typing import Optional, List, Dict, Any, AsyncIterator, Tuple
 import datetime
+import hashlib
+import json
 
 async def get_user_by_email(db: AsyncSession, email: str) -> Optional[models.User]:
     q = select(models.User).where(models.User.email == email)
@@ -21,12 +28,15 @@ async def create_user(db: AsyncSession, user_in: schemas.UserCreate, hashed_pass
         hashed_password=hashed_password
     )
     db.add(db_user)
+    await cache_bus.publish(db, "users", [db_user.email])
     await db.commit()
+    principal_cache.invalidate_user(db_user.email)
     await db.refresh(db_user)
     return db_user
 
 async def create_deck(db: AsyncSession, deck_in: schemas.DeckCreate, user_id: Optional[str] = None) -> models.Deck:
     deck = models.Deck(
+        id=models.generate_uuid(),
         user_id=user_id,
         name=deck_in.name,
         format=deck_in.format,
@@ -35,21 +45,180 @@ async def create_deck(db: AsyncSession, deck_in: schemas.DeckCreate, user_id: Op
         raw_data=deck_in.raw_data,
     )
     db.add(deck)
+    await cache_bus.publish(db, "deck_formats", [[deck.id, deck.format]])
     await db.commit()
     await db.refresh(deck)
+    stats_cache.set_deck_format(deck.id, deck.format)
     return deck
 
 async def create_decklist(db: AsyncSession, dl_in: schemas.DecklistCreate, user_id: Optional[str] = None) -> models.Decklist:
-    dl = models.Decklist(
-        user_id=user_id,
-        deck_id=dl_in.deck_id,
-        mainboard=dl_in.mainboard,
-        sideboard=dl_in.sideboard,
+    # content-addressed: an identical list for the same deck returns the stored row
+    mainboard, sideboard = canonical_board(dl_in.mainboard), canonical_board(dl_in.sideboard)
+    content_hash = decklist_content_hash(dl_in.deck_id, mainboard, sideboard)
+    D = models.Decklist.__table__
+    stmt = (
+        pg_insert(D)
+        .values(
+            id=models.generate_uuid(),
+            user_id=user_id,
+            deck_id=dl_in.deck_id,
+            mainboard=mainboard,
+            sideboard=sideboard,
+            content_hash=content_hash,
+            created_at=datetime.datetime.utcnow(),
+        )
+        .on_conflict_do_nothing(index_elements=["content_hash"])
+        .returning(D.c.id)
     )
-    db.add(dl)
+    dl_id = (await db.execute(stmt)).scalar()
+    if dl_id is None:
+        res = await db.execute(select(D.c.id).where(D.c.content_hash == content_hash))
+        dl_id = res.scalar_one()
+    else:
+        # card index rows go in the same transaction as the decklist
+        await index_decklist_cards(db, [(dl_id, mainboard, sideboard)])
+    await db.commit()
+    return await db.get(models.Decklist, dl_id)
+
+def canonical_board(cards: Optional[List[Dict[str, Any]]]) -> Optional[List[Dict[str, Any]]]:
+    # one entry per card (quantities merged), sorted by card_key; the first spelling seen is kept
+    if cards is None:
+        return None
+    merged: Dict[str, Dict[str, Any]] = {}
+    for c in cards:
+        entry = merged.setdefault(card_key(c["name"]), {"name": " ".join(c["name"].split()), "quantity": 0})
+        entry["quantity"] += int(c["quantity"])
+    return [merged[k] for k in sorted(merged)]
+
+def decklist_content_hash(deck_id: str, mainboard: Optional[list], sideboard: Optional[list]) -> str:
+    # over card keys, so spelling and line order don't matter; a missing board hashes as empty
+    def board(cards):
+        return [[card_key(c["name"]), c["quantity"]] for c in canonical_board(cards or [])]
+    payload = json.dumps([deck_id, board(mainboard), board(sideboard)], separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+async def dedupe_decklists(db: AsyncSession, dry_run: bool = False, batch_size: int = 1000) -> Dict[str, int]:
+    # Hashes every decklist, keeps the oldest of each identical set, repoints
+    # matches.decklist_id / opponent_decklist_id at it and deletes the rest, in one
+    # transaction. Keepers are rewritten in canonical form.
+    D = models.Decklist
+    keepers: Dict[str, str] = {}  # content hash -> kept decklist id
+    canonical: List[Dict[str, Any]] = []
+    repoint: List[Dict[str, str]] = []
+    q = select(D.id, D.deck_id, D.mainboard, D.sideboard, D.content_hash).order_by(D.created_at, D.id)
+    result = await db.stream(q.execution_options(yield_per=batch_size))
+    async for rows in result.partitions():
+        for r in rows:
+            h = decklist_content_hash(r.deck_id, r.mainboard, r.sideboard)
+            keep = keepers.setdefault(h, r.id)
+            if keep != r.id:
+                repoint.append({"old_id": r.id, "new_id": keep})
+            elif r.content_hash != h:
+                canonical.append({"kept_id": r.id, "main": canonical_board(r.mainboard), "side": canonical_board(r.sideboard), "hash": h})
+    summary = {"decklists": len(keepers) + len(repoint), "duplicates": len(repoint), "rewritten": len(canonical)}
+    if dry_run or not (repoint or canonical):
+        return summary
+
+    M, DT, DC = models.Match.__table__, D.__table__, models.DecklistCard.__table__
+    for start in range(0, len(repoint), batch_size):
+        batch = repoint[start:start + batch_size]
+        for col in (M.c.decklist_id, M.c.opponent_decklist_id):
+            await db.execute(M.update().where(col == bindparam("old_id")).values({col.name: bindparam("new_id")}), batch)
+        old_ids = [r["old_id"] for r in batch]
+        await db.execute(DC.delete().where(DC.c.decklist_id.in_(old_ids)))
+        await db.execute(DT.delete().where(DT.c.id.in_(old_ids)))
+    # after the deletes, so a keeper can't collide with a duplicate that already had the hash
+    for start in range(0, len(canonical), batch_size):
+        await db.execute(
+            DT.update().where(DT.c.id == bindparam("kept_id")).values(
+                mainboard=bindparam("main"), sideboard=bindparam("side"), content_hash=bindparam("hash")
+            ),
+            canonical[start:start + batch_size],
+        )
+    if repoint:
+        # decklist filters may now match other rows; every deck gets a new ETag marker
+        R = models.DeckStatsRollup.__table__
+        await db.execute(R.update().values(version=R.c.version + 1, updated_at=func.now()))
+        await cache_bus.publish(db, "all")
     await db.commit()
-    await db.refresh(dl)
-    return dl
+    return summary
+
+# -- normalized card index: cards (interned names) and decklist_cards --
+DECKLIST_BOARDS = (("main", "mainboard"), ("side", "sideboard"))
+
+def card_key(name: str) -> str:
+    # lookup key for a card name: case-insensitive, whitespace collapsed
+    return " ".join(name.split()).casefold()
+
+async def intern_cards(db: AsyncSession, names) -> Dict[str, int]:
+    # card_key -> cards.id, inserting unseen names; the first spelling seen is kept as `name`
+    by_key: Dict[str, str] = {}
+    for n in names:
+        by_key.setdefault(card_key(n), " ".join(n.split()))
+    if not by_key:
+        return {}
+    C = models.Card.__table__
+    # sorted so concurrent writers take the unique-index locks in the same order
+    rows = [{"name": by_key[k], "name_key": k} for k in sorted(by_key)]
+    await db.execute(pg_insert(C).values(rows).on_conflict_do_nothing(index_elements=["name_key"]))
+    res = await db.execute(select(C.c.name_key, C.c.id).where(C.c.name_key.in_(list(by_key))))
+    return dict(res.all())
+
+async def index_decklist_cards(db: AsyncSession, decklists) -> int:
+    # (decklist_id, mainboard, sideboard) tuples, boards as built by DecklistCreate;
+    # replaces those decklists' rows. Doesn't commit.
+    quantities: Dict[Tuple[str, str, str], int] = {}
+    names = []
+    for decklist_id, *boards in decklists:
+        for (board, _), cards in zip(DECKLIST_BOARDS, boards):
+            for c in cards or ():
+                # the same card may be listed on several lines
+                k = (decklist_id, card_key(c["name"]), board)
+                quantities[k] = quantities.get(k, 0) + int(c["quantity"])
+                names.append(c["name"])
+    ids = await intern_cards(db, names)
+    DC = models.DecklistCard.__table__
+    await db.execute(DC.delete().where(DC.c.decklist_id.in_([d[0] for d in decklists])))
+    rows = [
+        {"decklist_id": dl_id, "card_id": ids[key], "board": board, "quantity": q}
+        for (dl_id, key, board), q in quantities.items()
+    ]
+    if rows:
+        await db.execute(DC.insert(), rows)
+    return len(rows)
+
+async def backfill_decklist_cards(db: AsyncSession, batch_size: int = 500) -> int:
+    # rebuilds decklist_cards for every decklist, one transaction per batch
+    D = models.Decklist
+    last_id = None
+    done = 0
+    while True:
+        q = select(D.id, D.mainboard, D.sideboard).order_by(D.id).limit(batch_size)
+        if last_id is not None:
+            q = q.where(D.id > last_id)
+        batch = (await db.execute(q)).all()
+        if not batch:
+            return done
+        await index_decklist_cards(db, [tuple(r) for r in batch])
+        # card filters may now match other rows; as for dedupe, every deck gets a new ETag
+        # marker and running workers drop their cached stats, once per committed batch
+        R = models.DeckStatsRollup.__table__
+        await db.execute(R.update().values(version=R.c.version + 1, updated_at=func.now()))
+        await cache_bus.publish(db, "all")
+        await db.commit()
+        done += len(batch)
+        last_id = batch[-1].id
+
+def card_filter(card: str, min_quantity: Optional[int] = None, board: Optional[str] = None):
+    # matches whose decklist plays at least `min_quantity` copies of `card` in `board`;
+    # resolved through the (card_id, board, quantity) index
+    C, DC = models.Card, models.DecklistCard
+    decklists = (
+        select(DC.decklist_id)
+        .join(C, C.id == DC.card_id)
+        .where(C.name_key == card_key(card), DC.board == (board or "main"), DC.quantity >= (min_quantity or 1))
+    )
+    return models.Match.decklist_id.in_(decklists)
 
 async def create_player(db: AsyncSession, player_in: schemas.PlayerCreate) -> models.Player:
     p = models.Player(
@@ -59,12 +228,61 @@ async def create_player(db: AsyncSession, player_in: schemas.PlayerCreate) -> mo
         melee_account=player_in.melee_account,
     )
     db.add(p)
+    # names that may have been cached as unknown
+    names = [[platform, name] for platform, names in (("mtgo", p.mtgo_usernames), ("arena", p.arena_usernames)) for name in names or ()]
+    await cache_bus.publish(db, "player_names", names)
     await db.commit()
+    for platform, name in names:
+        player_name_cache.pop((platform, name))
     await db.refresh(p)
     return p
 
-async def create_match(db: AsyncSession, match_in: schemas.MatchCreate) -> models.Match:
-    m = models.Match(
+# -- player resolution by MTGO / Arena username --
+PLAYER_USERNAME_COLUMNS = {"mtgo": "mtgo_usernames", "arena": "arena_usernames"}
+_UNCACHED = object()
+
+async def lookup_players(db: AsyncSession, platform: str, names) -> Dict[str, Optional[str]]:
+    # {name: player id or None}: cached names first, the rest in one `&&` query on the GIN
+    # index. A name listed by several players resolves to the oldest.
+    found: Dict[str, Optional[str]] = {}
+    missing = []
+    for name in dict.fromkeys(names):
+        hit = player_name_cache.get((platform, name), _UNCACHED)
+        if hit is _UNCACHED:
+            missing.append(name)
+        else:
+            found[name] = hit
+    if missing:
+        P = models.Player
+        col = getattr(P, PLAYER_USERNAME_COLUMNS[platform])
+        q = select(P.id, col).where(col.overlap(missing)).order_by(P.created_at, P.id)
+        wanted = set(missing)
+        resolved: Dict[str, str] = {}
+        for player_id, usernames in (await db.execute(q)).all():
+            for name in usernames:
+                if name in wanted:
+                    resolved.setdefault(name, player_id)
+        for name in missing:
+            found[name] = resolved.get(name)
+            player_name_cache.set((platform, name), found[name])
+    return found
+
+async def fill_opponent_players(db: AsyncSession, rows: List[Dict[str, Any]]) -> None:
+    # sets opponent_player_id from opponent_name where it's missing: MTGO names first, then Arena
+    pending = [r for r in rows if r.get("opponent_player_id") is None and r.get("opponent_name")]
+    for platform in PLAYER_USERNAME_COLUMNS:
+        if not pending:
+            return
+        ids = await lookup_players(db, platform, [r["opponent_name"] for r in pending])
+        for r in pending:
+            r["opponent_player_id"] = ids[r["opponent_name"]]
+        pending = [r for r in pending if r["opponent_player_id"] is None]
+
+def match_values(match_in: schemas.MatchCreate) -> Dict[str, Any]:
+    # column values for a new match; id and created_at are generated here so batched
+    # inserts don't need a round trip to learn them
+    return dict(
+        id=models.generate_uuid(),
         deck_id=match_in.deck_id,
         decklist_id=match_in.decklist_id,
         player_id=match_in.player_id,
@@ -77,12 +295,91 @@ async def create_match(db: AsyncSession, match_in: schemas.MatchCreate) -> model
         opponent_mulligan_array=match_in.opponent_mulligan_array,
         play_draw_array=match_in.play_draw_array,
         game2_sideboard=match_in.game2_sideboard,
-        game3_sideboard=match_in.game3_sideboard
+        game3_sideboard=match_in.game3_sideboard,
+        created_at=datetime.datetime.utcnow(),
     )
-    db.add(m)
+
+async def create_match(db: AsyncSession, match_in: schemas.MatchCreate):
+    rows = await create_matches(db, [match_in])
+    return rows[0]
+
+async def create_matches(db: AsyncSession, matches_in: List[schemas.MatchCreate]) -> list:
+    # one transaction for several independent POST /match requests (app.ingest group commit,
+    # or a batch of one). INSERT ... RETURNING hands back the stored rows, no refresh round trip.
+    rows = [match_values(m) for m in matches_in]
+    await fill_opponent_players(db, rows)
+    t = models.Match.__table__
+    res = await db.execute(pg_insert(t).values(rows).returning(*t.c))
+    by_id = {r.id: r for r in res.all()}
+    created = [by_id[r["id"]] for r in rows]
+    # keep the decks' stats rollups and daily buckets in step with the matches, in the same transaction
+    deck_ids = await apply_match_rollups(db, rows)
+    await cache_bus.publish(db, "decks", deck_ids)
+    await db.commit()
+    # bump only after commit so a concurrent reader can't cache pre-commit data under the new version
+    for deck_id in deck_ids:
+        stats_cache.bump_deck(deck_id)
+    return created
+
+async def apply_match_rollups(db: AsyncSession, rows: List[Dict[str, Any]]) -> List[str]:
+    # one rollup upsert per deck and one daily bucket upsert per (deck, day), in deck order so
+    # concurrent writers lock rollup rows in the same order; returns the deck ids touched
+    rollups: Dict[str, Dict[str, Any]] = {}
+    daily: Dict[Tuple[str, datetime.date], Dict[str, Any]] = {}
+    for r in rows:
+        deltas = match_rollup_deltas(r["game_win_array"], r["mulligan_array"], r["play_draw_array"])
+        merge_rollup(rollups.setdefault(r["deck_id"], empty_rollup()), deltas)
+        merge_rollup(daily.setdefault((r["deck_id"], r["created_at"].date()), empty_rollup()), deltas)
+    if rollups:
+        await db.execute(rollup_stmt([{"deck_id": k, **rollups[k]} for k in sorted(rollups)]))
+        await db.execute(daily_rollup_stmt([daily_row(deck_id, day, daily[deck_id, day]) for deck_id, day in sorted(daily)]))
+    await remember_deck_formats(db, rollups)
+    return list(rollups)
+
+# foreign keys a MatchCreate may reference, checked up front by bulk ingestion
+MATCH_REFERENCES = (
+    ("deck_id", models.Deck),
+    ("opponent_deck_id", models.Deck),
+    ("decklist_id", models.Decklist),
+    ("opponent_decklist_id", models.Decklist),
+    ("player_id", models.Player),
+    ("opponent_player_id", models.Player),
+)
+
+async def find_missing_references(db: AsyncSession, matches_in: List[schemas.MatchCreate]) -> Dict[int, str]:
+    # one query per referenced table, the ids bound as a single array parameter so large
+    # imports stay clear of the 32767 bind-parameter limit; returns {index: error detail}
+    wanted: Dict[Any, set] = {}
+    for field, model in MATCH_REFERENCES:
+        ids = wanted.setdefault(model, set())
+        ids.update(v for v in (getattr(m, field) for m in matches_in) if v is not None)
+    found: Dict[Any, set] = {}
+    for model, ids in wanted.items():
+        found[model] = set()
+        if ids:
+            res = await db.execute(select(model.id).where(model.id == any_(bindparam("ids", list(ids), type_=ARRAY(String)))))
+            found[model] = set(res.scalars().all())
+    errors = {}
+    for i, m in enumerate(matches_in):
+        missing = [f for f, model in MATCH_REFERENCES if getattr(m, f) is not None and getattr(m, f) not in found[model]]
+        if missing:
+            errors[i] = "unknown " + ", ".join(missing)
+    return errors
+
+async def create_matches_bulk(db: AsyncSession, matches_in: List[schemas.MatchCreate], batch_size: int = 1000) -> List[str]:
+    # one transaction: multi-row INSERTs of `batch_size` rows plus one rollup upsert per deck
+    # and one daily bucket upsert per (deck, day)
+    rows = [match_values(m) for m in matches_in]
+    await fill_opponent_players(db, rows)
+    table = models.Match.__table__
+    for start in range(0, len(rows), batch_size):
+        await db.execute(table.insert(), rows[start:start + batch_size])
+    deck_ids = await apply_match_rollups(db, rows)
+    await cache_bus.publish(db, "decks", deck_ids)
     await db.commit()
-    await db.refresh(m)
-    return m
+    for deck_id in deck_ids:
+        stats_cache.bump_deck(deck_id)
+    return [r["id"] for r in rows]
 
 async def get_deck(db: AsyncSession, deck_id: str) -> Optional[models.Deck]:
     res = await db.get(models.Deck, deck_id)
@@ -92,15 +389,30 @@ async def get_decklist(db: AsyncSession, decklist_id: str) -> Optional[models.De
     res = await db.get(models.Decklist, decklist_id)
     return res
 
-# async def get_decks(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[models.Deck]:
-#     q = select(models.Deck).offset(skip).limit(limit)
-#     res = await db.execute(q)
-#     return res.scalars().all()
+# -- keyset pagination on (created_at, id), newest first; deep pages cost the same as the first --
+async def _keyset_page(db: AsyncSession, model, filters: list, limit: int, after: Optional[Tuple[datetime.datetime, str]] = None) -> Tuple[list, bool]:
+    q = select(model).where(*filters)
+    if after:
+        q = q.where(tuple_(model.created_at, model.id) < tuple_(literal(after[0]), literal(after[1])))
+    q = q.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1)
+    res = await db.execute(q)
+    rows = res.scalars().all()
+    return rows[:limit], len(rows) > limit
+
+async def get_decks(db: AsyncSession, user_id: Optional[str] = None, limit: int = 100, after: Optional[Tuple[datetime.datetime, str]] = None) -> Tuple[List[models.Deck], bool]:
+    filters = [models.Deck.user_id == user_id] if user_id else []
+    return await _keyset_page(db, models.Deck, filters, limit, after)
+
+async def get_players(db: AsyncSession, limit: int = 100, after: Optional[Tuple[datetime.datetime, str]] = None) -> Tuple[List[models.Player], bool]:
+    return await _keyset_page(db, models.Player, [], limit, after)
 
-# async def get_players(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[models.Player]:
-#     q = select(models.Player).offset(skip).limit(limit)
-#     res = await db.execute(q)
-#     return res.scalars().all()
+async def get_matches_page(db: AsyncSession, deck_id: Optional[str] = None, player_id: Optional[str] = None, limit: int = 100, after: Optional[Tuple[datetime.datetime, str]] = None) -> Tuple[List[models.Match], bool]:
+    filters = []
+    if deck_id:
+        filters.append(models.Match.deck_id == deck_id)
+    if player_id:
+        filters.append(models.Match.player_id == player_id)
+    return await _keyset_page(db, models.Match, filters, limit, after)
 
 async def get_matches_for_deck(db: AsyncSession, deck_id: str, time_from: Optional[datetime.datetime]=None, time_to: Optional[datetime.datetime]=None) -> List[models.Match]:
     q = select(models.Match).where(models.Match.deck_id == deck_id)
@@ -111,9 +423,224 @@ async def get_matches_for_deck(db: AsyncSession, deck_id: str, time_from: Option
     res = await db.execute(q)
     return res.scalars().all()
 
+async def stream_matches_for_deck(db: AsyncSession, deck_id: str, time_from: Optional[datetime.datetime]=None, time_to: Optional[datetime.datetime]=None, chunk_size: int = 1000) -> AsyncIterator[list]:
+    # plain rows, `chunk_size` at a time, through a server-side cursor; nothing is buffered beyond one chunk
+    t = models.Match.__table__
+    q = select(*t.columns).where(t.c.deck_id == deck_id)
+    if time_from:
+        q = q.where(t.c.created_at >= time_from)
+    if time_to:
+        q = q.where(t.c.created_at <= time_to)
+    q = q.order_by(t.c.created_at, t.c.id).execution_options(yield_per=chunk_size)
+    res = await db.stream(q)
+    async for chunk in res.partitions(chunk_size):
+        yield chunk
+
+async def get_match_arrays_for_deck(db: AsyncSession, deck_id: str, time_from: Optional[datetime.datetime]=None, time_to: Optional[datetime.datetime]=None) -> stats_engine.MatchArrays:
+    # only the per-game array columns, straight into NumPy; no ORM objects
+    M = models.Match
+    q = select(M.game_win_array, M.mulligan_array, M.opponent_mulligan_array, M.play_draw_array).where(M.deck_id == deck_id)
+    if time_from:
+        q = q.where(M.created_at >= time_from)
+    if time_to:
+        q = q.where(M.created_at <= time_to)
+    res = await db.execute(q)
+    return stats_engine.MatchArrays.from_rows(res.all())
+
+async def get_game_patterns(db: AsyncSession, deck_id: str) -> Dict[Tuple[int, int], int]:
+    # {(game wins, games played): matches}, grouped in PostgreSQL; a handful of rows per deck
+    M = models.Match
+    wins = func.coalesce(_array_sum(M.game_win_array), 0)
+    games = func.coalesce(func.cardinality(M.game_win_array), 0)
+    q = select(wins, games, func.count()).where(M.deck_id == deck_id).group_by(wins, games)
+    res = await db.execute(q)
+    return {(int(w), int(g)): int(n) for w, g, n in res.all()}
+
+async def get_match_arrays_for_decks(db: AsyncSession, deck_ids, time_from: Optional[datetime.datetime] = None, time_to: Optional[datetime.datetime] = None) -> Dict[str, stats_engine.MatchArrays]:
+    # get_match_arrays_for_deck for many decks in one query, split by deck
+    M = models.Match
+    q = select(M.deck_id, M.game_win_array, M.mulligan_array, M.opponent_mulligan_array, M.play_draw_array).where(M.deck_id.in_(list(deck_ids)))
+    if time_from:
+        q = q.where(M.created_at >= time_from)
+    if time_to:
+        q = q.where(M.created_at <= time_to)
+    by_deck: Dict[str, list] = {deck_id: [] for deck_id in deck_ids}
+    for row in (await db.execute(q)).all():
+        by_deck[row.deck_id].append(row)
+    return {deck_id: stats_engine.MatchArrays.from_rows(rows) for deck_id, rows in by_deck.items()}
+
+# -- winrate query builder: filters and aggregates run inside PostgreSQL --
+def _array_sum(arr):
+    # (SELECT coalesce(sum(x), 0) FROM unnest(arr) AS x), correlated to the outer row
+    x = func.unnest(arr).column_valued("x")
+    return select(func.coalesce(func.sum(x), 0)).scalar_subquery()
+
+def _array_any_startswith(arr, prefixes):
+    # EXISTS (SELECT 1 FROM unnest(arr) AS pd WHERE lower(pd) LIKE 'p%' OR ...)
+    pd = func.unnest(arr).column_valued("pd")
+    return exists(select(literal(1)).where(or_(*[func.lower(pd).startswith(p) for p in prefixes])))
+
+def _mulligan_lte(arr, threshold: int):
+    # no game above the threshold; matches without mulligan data are kept
+    return or_(arr.is_(None), not_(literal(threshold) < any_(arr)))
+
+def match_won_expr():
+    # a match is won with 2+ game wins (best of 3)
+    return _array_sum(models.Match.game_win_array) >= 2
+
+def winrate_filters(
+    deck_id: str,
+    time_from: Optional[datetime.datetime] = None,
+    time_to: Optional[datetime.datetime] = None,
+    player_mulligan_lte: Optional[int] = None,
+    opponent_mulligan_lte: Optional[int] = None,
+    play_draw: Optional[str] = None,
+    card: Optional[str] = None,
+    card_min_quantity: Optional[int] = None,
+    card_board: Optional[str] = None,
+) -> list:
+    M = models.Match
+    clauses = [M.deck_id == deck_id]
+    if time_from:
+        clauses.append(M.created_at >= time_from)
+    if time_to:
+        clauses.append(M.created_at <= time_to)
+    if player_mulligan_lte is not None:
+        clauses.append(_mulligan_lte(M.mulligan_array, player_mulligan_lte))
+    if opponent_mulligan_lte is not None:
+        clauses.append(_mulligan_lte(M.opponent_mulligan_array, opponent_mulligan_lte))
+    if play_draw:
+        # matches without play/draw data are never filtered out
+        no_pd_data = func.coalesce(func.cardinality(M.play_draw_array), 0) == 0
+        wanted = play_draw.lower()
+        if wanted.startswith("p"):
+            clauses.append(or_(no_pd_data, _array_any_startswith(M.play_draw_array, ["p"])))
+        elif wanted.startswith("d"):
+            clauses.append(or_(no_pd_data, _array_any_startswith(M.play_draw_array, ["d"])))
+        else:
+            # neither: matches that didn't play nor draw anywhere
+            clauses.append(not_(_array_any_startswith(M.play_draw_array, ["p", "d"])))
+    if card:
+        # matches without a decklist never match a card filter
+        clauses.append(card_filter(card, card_min_quantity, card_board))
+    return clauses
+
+def build_winrate_query(deck_id: str, game: Optional[int] = None, **filters):
+    # one aggregate row: (wins, total)
+    M = models.Match
+    if game is None:
+        wins = func.count().filter(match_won_expr())
+        total = func.count()
+    else:
+        # game-specific winrate: game param is 1-based, as are PostgreSQL arrays
+        played = func.coalesce(func.cardinality(M.game_win_array), 0) >= game
+        wins = func.coalesce(func.sum(M.game_win_array[game]).filter(played), 0)
+        total = func.count().filter(played)
+    return select(wins.label("wins"), total.label("total")).where(*winrate_filters(deck_id, **filters))
+
+async def get_deck_winrate(db: AsyncSession, deck_id: str, game: Optional[int] = None, **filters) -> Dict[str, Any]:
+    res = await db.execute(build_winrate_query(deck_id, game=game, **filters))
+    row = res.one()
+    wins, total = int(row.wins), int(row.total)
+    return {"wins": wins, "total": total, "winrate": (wins / total) if total > 0 else 0.0}
+
+# -- matchup matrix: one GROUP BY (deck_id, opponent_deck_id) over matches joined to decks --
+async def get_matchups(db: AsyncSession, format: Optional[str] = None, time_from: Optional[datetime.datetime] = None, time_to: Optional[datetime.datetime] = None) -> list:
+    M, D = models.Match, models.Deck
+    Opp = aliased(models.Deck)
+    q = (
+        select(
+            M.deck_id,
+            D.name.label("deck_name"),
+            M.opponent_deck_id,
+            Opp.name.label("opponent_deck_name"),
+            func.count().label("matches"),
+            func.count().filter(match_won_expr()).label("match_wins"),
+            func.coalesce(func.sum(func.cardinality(M.game_win_array)), 0).label("games"),
+            func.coalesce(func.sum(_array_sum(M.game_win_array)), 0).label("game_wins"),
+        )
+        .join(D, D.id == M.deck_id)
+        .join(Opp, Opp.id == M.opponent_deck_id)
+        .group_by(M.deck_id, D.name, M.opponent_deck_id, Opp.name)
+    )
+    if format:
+        q = q.where(D.format == format)
+    if time_from:
+        q = q.where(M.created_at >= time_from)
+    if time_to:
+        q = q.where(M.created_at <= time_to)
+    res = await db.execute(q)
+    return res.all()
+
+# -- metagame: one GROUP BY deck over a format's matches joined to decks --
+def _whole_days(time_from: Optional[datetime.datetime], time_to: Optional[datetime.datetime]) -> bool:
+    # windows the daily buckets answer exactly: open-ended, starting at a UTC midnight
+    # (bounds are naive UTC, see utils.parse_iso_or_none)
+    if time_to is not None:
+        return False
+    if time_from is None:
+        return True
+    return time_from.time() == datetime.time(0)
+
+async def get_metagame(db: AsyncSession, format: Optional[str] = None, time_from: Optional[datetime.datetime] = None, time_to: Optional[datetime.datetime] = None) -> list:
+    # rows of (deck_id, deck_name, matches, match_wins, games, game_wins). Whole-day windows
+    # sum deck_daily_stats (one row per deck and day); others aggregate the matches.
+    D = models.Deck
+    if _whole_days(time_from, time_to):
+        S = models.DeckDailyStats
+        q = select(
+            S.deck_id,
+            D.name.label("deck_name"),
+            func.sum(S.total_matches).label("matches"),
+            func.sum(S.match_wins).label("match_wins"),
+            func.sum(S.total_games).label("games"),
+            func.sum(S.game_wins).label("game_wins"),
+        ).join(D, D.id == S.deck_id).group_by(S.deck_id, D.name)
+        if time_from:
+            q = q.where(S.day >= time_from.date())
+    else:
+        M = models.Match
+        q = select(
+            M.deck_id,
+            D.name.label("deck_name"),
+            func.count().label("matches"),
+            func.count().filter(match_won_expr()).label("match_wins"),
+            func.coalesce(func.sum(func.cardinality(M.game_win_array)), 0).label("games"),
+            func.coalesce(func.sum(_array_sum(M.game_win_array)), 0).label("game_wins"),
+        ).join(D, D.id == M.deck_id).group_by(M.deck_id, D.name)
+        if time_from:
+            q = q.where(M.created_at >= time_from)
+        if time_to:
+            q = q.where(M.created_at <= time_to)
+    if format:
+        q = q.where(D.format == format)
+    res = await db.execute(q)
+    return res.all()
+
+async def remember_deck_formats(db: AsyncSession, deck_ids) -> None:
+    # fills stats_cache's deck -> format memo, so bump_deck can invalidate per format;
+    # only decks not seen before are looked up
+    unknown = [d for d in set(deck_ids) if not stats_cache.knows_deck(d)]
+    if unknown:
+        res = await db.execute(select(models.Deck.id, models.Deck.format).where(models.Deck.id.in_(unknown)))
+        for deck_id, fmt in res.all():
+            stats_cache.set_deck_format(deck_id, fmt)
+
 # -- stats computation helper (in crud for now) --
-def compute_deck_stats(matches):
+@STATS_COMPUTE.time(impl="numpy")
+def compute_deck_stats_np(matches, confidence: Optional[float] = None, resamples: int = stats_engine.DEFAULT_RESAMPLES, seed: int = stats_engine.DEFAULT_SEED) -> Dict[str, Any]:
+    # vectorized equivalent of compute_deck_stats; accepts MatchArrays or rows / Match objects
+    arrays = matches if isinstance(matches, stats_engine.MatchArrays) else stats_engine.MatchArrays.from_rows(matches)
+    stats = stats_from_rollup(stats_engine.deck_counters(arrays))
+    if confidence is not None:
+        stats["confidence_intervals"] = stats_engine.deck_intervals(stats_engine.game_patterns(arrays), confidence, resamples, seed)
+    return stats
+
+@STATS_COMPUTE.time(impl="reference")
+def compute_deck_stats(matches, confidence: Optional[float] = None, resamples: int = stats_engine.DEFAULT_RESAMPLES, seed: int = stats_engine.DEFAULT_SEED):
+    # reference implementation, kept for equivalence checks against compute_deck_stats_np
     # input: list of Match ORM objects
+    # with `confidence` (e.g. 0.95), also Wilson and bootstrap intervals on both winrates
     total_matches = len(matches)
     total_games = 0
     match_wins = 0
@@ -177,7 +704,7 @@ def compute_deck_stats(matches):
         mulligan_stats["max_mulligans"] = max(mulligan_counts)
         mulligan_stats["min_mulligans"] = min(mulligan_counts)
 
-    return {
+    stats = {
         "total_matches": total_matches,
         "total_games": total_games,
         "match_winrate": match_winrate,
@@ -185,3 +712,286 @@ def compute_deck_stats(matches):
         "by_play_draw": bpd_pct,
         "mulligan_stats": mulligan_stats
     }
+    if confidence is not None:
+        # (game wins, games) per match
+        patterns: Dict[Tuple[int, int], int] = {}
+        for m in matches:
+            games = m.game_win_array or []
+            k = (sum(int(g) for g in games), len(games))
+            patterns[k] = patterns.get(k, 0) + 1
+        stats["confidence_intervals"] = stats_engine.deck_intervals(patterns, confidence, resamples, seed)
+    return stats
+
+
+# -- deck stats rollup: running counters per deck --
+ROLLUP_COUNTERS = (
+    "total_matches", "total_games", "match_wins", "game_wins",
+    "play_wins", "play_games", "draw_wins", "draw_games", "neither_wins", "neither_games",
+    "mulligan_sum", "mulligan_count",
+)
+
+def _play_draw_key(pd: List[Optional[str]], idx: int) -> str:
+    # same classification as compute_deck_stats
+    if idx >= len(pd) or pd[idx] is None:
+        return "neither"
+    v = pd[idx].lower()
+    if v.startswith("p"):
+        return "play"
+    if v.startswith("d"):
+        return "draw"
+    return "neither"
+
+def empty_rollup() -> Dict[str, Any]:
+    counters = {k: 0 for k in ROLLUP_COUNTERS}
+    counters["mulligan_min"] = None
+    counters["mulligan_max"] = None
+    return counters
+
+def match_rollup_deltas(game_win_array, mulligan_array, play_draw_array) -> Dict[str, Any]:
+    # counter increments contributed by a single match
+    d = empty_rollup()
+    games = game_win_array or []
+    wins = sum(int(g) for g in games)
+    d["total_matches"] = 1
+    d["total_games"] = len(games)
+    d["match_wins"] = 1 if len(games) > 0 and wins >= 2 else 0
+    d["game_wins"] = wins
+    pd = play_draw_array or []
+    for idx, outcome in enumerate(games):
+        key = _play_draw_key(pd, idx)
+        d[f"{key}_games"] += 1
+        if int(outcome) == 1:
+            d[f"{key}_wins"] += 1
+    if mulligan_array:
+        mulls = [int(x) for x in mulligan_array]
+        d["mulligan_sum"] = sum(mulls)
+        d["mulligan_count"] = len(mulls)
+        d["mulligan_min"] = min(mulls)
+        d["mulligan_max"] = max(mulls)
+    return d
+
+def merge_rollup(acc: Dict[str, Any], d: Dict[str, Any]) -> Dict[str, Any]:
+    for k in ROLLUP_COUNTERS:
+        acc[k] += d[k]
+    for k, pick in (("mulligan_min", min), ("mulligan_max", max)):
+        if d[k] is not None:
+            acc[k] = d[k] if acc[k] is None else pick(acc[k], d[k])
+    return acc
+
+def rollup_stmt(rows: List[Dict[str, Any]]):
+    # INSERT ... ON CONFLICT (deck_id) DO UPDATE adding the increments to the stored counters
+    t = models.DeckStatsRollup.__table__
+    stmt = pg_insert(t).values([{**r, "version": 1} for r in rows])
+    ex = stmt.excluded
+    updates = {k: t.c[k] + ex[k] for k in ROLLUP_COUNTERS}
+    # least/greatest ignore NULLs in PostgreSQL
+    updates["mulligan_min"] = func.least(t.c.mulligan_min, ex.mulligan_min)
+    updates["mulligan_max"] = func.greatest(t.c.mulligan_max, ex.mulligan_max)
+    updates["version"] = t.c.version + 1
+    updates["updated_at"] = func.now()
+    return stmt.on_conflict_do_update(index_elements=[t.c.deck_id], set_=updates)
+
+async def upsert_deck_rollup(db: AsyncSession, deck_id: str, deltas: Dict[str, Any]) -> None:
+    await db.execute(rollup_stmt([{"deck_id": deck_id, **deltas}]))
+
+async def get_deck_rollup(db: AsyncSession, deck_id: str) -> Dict[str, Any]:
+    row = await db.get(models.DeckStatsRollup, deck_id)
+    counters = empty_rollup()
+    if row is not None:
+        for k in counters:
+            counters[k] = getattr(row, k)
+    return counters
+
+async def get_deck_rollups(db: AsyncSession, deck_ids) -> Dict[str, Tuple[Dict[str, Any], Tuple]]:
+    # get_deck_rollup plus rollup_marker for many decks in one query; decks without matches get zeroed counters
+    R = models.DeckStatsRollup
+    rollups = {deck_id: (empty_rollup(), rollup_marker(None)) for deck_id in deck_ids}
+    if rollups:
+        res = await db.execute(select(R).where(R.deck_id.in_(list(rollups))))
+        for row in res.scalars().all():
+            rollups[row.deck_id] = ({k: getattr(row, k) for k in empty_rollup()}, rollup_marker(row))
+    return rollups
+
+def rollup_marker(row: Optional[models.DeckStatsRollup]) -> Tuple:
+    # changes whenever the deck's matches do: version is bumped by every create_match, and a
+    # rebuild resets it but rewrites updated_at. A deck without matches has (0, None).
+    if row is None:
+        return (0, None)
+    return (row.version, row.updated_at.isoformat() if row.updated_at else None)
+
+async def get_deck_marker(db: AsyncSession, deck_id: str) -> Tuple:
+    # a primary-key read; get_deck_rollup in the same session then reuses the loaded row
+    return rollup_marker(await db.get(models.DeckStatsRollup, deck_id))
+
+@STATS_COMPUTE.time(impl="rollup")
+def stats_from_rollup(c: Dict[str, Any]) -> Dict[str, Any]:
+    # same output shape as compute_deck_stats
+    total_matches = c["total_matches"]
+    total_games = c["total_games"]
+    bpd_pct = {}
+    for k in ("play", "draw", "neither"):
+        games = c[f"{k}_games"]
+        bpd_pct[k] = (c[f"{k}_wins"] / games) if games > 0 else None
+    mulligan_stats = {}
+    if c["mulligan_count"]:
+        mulligan_stats["avg_mulligans_per_game"] = c["mulligan_sum"] / c["mulligan_count"]
+        mulligan_stats["max_mulligans"] = c["mulligan_max"]
+        mulligan_stats["min_mulligans"] = c["mulligan_min"]
+    return {
+        "total_matches": total_matches,
+        "total_games": total_games,
+        "match_winrate": (c["match_wins"] / total_matches) if total_matches > 0 else 0.0,
+        "game_winrate": (c["game_wins"] / total_games) if total_games > 0 else 0.0,
+        "by_play_draw": bpd_pct,
+        "mulligan_stats": mulligan_stats,
+    }
+
+async def _stream_rollups(db: AsyncSession, deck_id: Optional[str], key, batch_size: int) -> Dict[Any, Dict[str, Any]]:
+    # recompute counters from `matches` grouped by key(row), streaming rows rather than loading them all
+    M = models.Match
+    q = select(M.deck_id, M.created_at, M.game_win_array, M.mulligan_array, M.opponent_mulligan_array, M.play_draw_array).execution_options(yield_per=batch_size)
+    if deck_id:
+        q = q.where(M.deck_id == deck_id)
+    rollups: Dict[Any, Dict[str, Any]] = {}
+    res = await db.stream(q)
+    async for chunk in res.partitions(batch_size):
+        groups: Dict[Any, list] = {}
+        for row in chunk:
+            groups.setdefault(key(row), []).append(row)
+        for k, rows in groups.items():
+            acc = rollups.setdefault(k, empty_rollup())
+            merge_rollup(acc, stats_engine.deck_counters(stats_engine.MatchArrays.from_rows(rows)))
+    return rollups
+
+async def compute_deck_rollups(db: AsyncSession, deck_id: Optional[str] = None, batch_size: int = 5000) -> Dict[str, Dict[str, Any]]:
+    return await _stream_rollups(db, deck_id, lambda r: r.deck_id, batch_size)
+
+async def compute_daily_rollups(db: AsyncSession, deck_id: Optional[str] = None, batch_size: int = 5000) -> Dict[Tuple[str, datetime.date], Dict[str, Any]]:
+    # {(deck_id, day): counters}; matches without created_at have no bucket
+    rollups = await _stream_rollups(db, deck_id, lambda r: (r.deck_id, r.created_at.date() if r.created_at else None), batch_size)
+    return {k: v for k, v in rollups.items() if k[1] is not None}
+
+async def rebuild_deck_stats_rollup(db: AsyncSession, deck_id: Optional[str] = None) -> int:
+    # rebuilds deck_stats_rollup and deck_daily_stats together, in one transaction. Match
+    # inserts upsert both tables in their own transaction, so this lock makes them wait for the
+    # rebuild and apply on top of it; without it a match committed between the read of
+    # `matches` and the delete would lose its increment. Reads of the rollups are not blocked.
+    await db.execute(text("LOCK TABLE deck_stats_rollup, deck_daily_stats IN SHARE ROW EXCLUSIVE MODE"))
+    rollups = await compute_deck_rollups(db, deck_id)
+    daily = await compute_daily_rollups(db, deck_id)
+    for t in (models.DeckStatsRollup.__table__, models.DeckDailyStats.__table__):
+        q = t.delete()
+        if deck_id:
+            q = q.where(t.c.deck_id == deck_id)
+        await db.execute(q)
+    if rollups:
+        await db.execute(models.DeckStatsRollup.__table__.insert(), [{"deck_id": k, **v} for k, v in rollups.items()])
+    if daily:
+        await db.execute(models.DeckDailyStats.__table__.insert(), [daily_row(k, day, v) for (k, day), v in daily.items()])
+    # running workers drop what they cached from the old rollups
+    if deck_id:
+        await cache_bus.publish(db, "decks", [deck_id])
+    else:
+        await cache_bus.publish(db, "all")
+    await db.commit()
+    return len(rollups)
+
+async def check_deck_stats_rollup(db: AsyncSession, deck_id: Optional[str] = None) -> List[str]:
+    # deck ids whose stored rollup disagrees with the match history
+    expected = await compute_deck_rollups(db, deck_id)
+    q = select(models.DeckStatsRollup)
+    if deck_id:
+        q = q.where(models.DeckStatsRollup.deck_id == deck_id)
+    stored = {r.deck_id: r for r in (await db.execute(q)).scalars().all()}
+    mismatched = []
+    for k in sorted(set(expected) | set(stored)):
+        want = expected.get(k, empty_rollup())
+        row = stored.get(k)
+        have = {c: getattr(row, c) for c in want} if row is not None else empty_rollup()
+        if have != want:
+            mismatched.append(k)
+    # daily buckets
+    expected_daily = await compute_daily_rollups(db, deck_id)
+    DDS = models.DeckDailyStats
+    q = select(DDS)
+    if deck_id:
+        q = q.where(DDS.deck_id == deck_id)
+    stored_daily = {(r.deck_id, r.day): r for r in (await db.execute(q)).scalars().all()}
+    for k in set(expected_daily) | set(stored_daily):
+        want = daily_row(k[0], k[1], expected_daily.get(k, empty_rollup()))
+        row = stored_daily.get(k)
+        have = {c: getattr(row, c) for c in want} if row is not None else daily_row(k[0], k[1], empty_rollup())
+        if have != want and k[0] not in mismatched:
+            mismatched.append(k[0])
+    return sorted(mismatched)
+
+# -- daily buckets (deck_daily_stats) and trends --
+DAILY_COUNTERS = (
+    "total_matches", "total_games", "match_wins", "game_wins",
+    "play_wins", "play_games", "draw_wins", "draw_games", "neither_wins", "neither_games",
+)
+TREND_BUCKET_DAYS = {"day": 1, "week": 7}
+
+def daily_row(deck_id: str, day: datetime.date, counters: Dict[str, Any]) -> Dict[str, Any]:
+    return {"deck_id": deck_id, "day": day, **{k: counters[k] for k in DAILY_COUNTERS}}
+
+def daily_rollup_stmt(rows: List[Dict[str, Any]]):
+    # INSERT ... ON CONFLICT (deck_id, day) DO UPDATE adding the increments, like rollup_stmt
+    t = models.DeckDailyStats.__table__
+    stmt = pg_insert(t).values(rows)
+    ex = stmt.excluded
+    return stmt.on_conflict_do_update(
+        index_elements=[t.c.deck_id, t.c.day],
+        set_={k: t.c[k] + ex[k] for k in DAILY_COUNTERS},
+    )
+
+def bucket_start(day: datetime.date, bucket: str) -> datetime.date:
+    # weeks start on Monday
+    return day - datetime.timedelta(days=day.weekday()) if bucket == "week" else day
+
+async def get_deck_trend(
+    db: AsyncSession,
+    deck_id: str,
+    bucket: str = "day",
+    window: int = 1,
+    date_from: Optional[datetime.date] = None,
+    date_to: Optional[datetime.date] = None,
+) -> List[Dict[str, Any]]:
+    # One range scan over deck_daily_stats: a point per bucket from date_from (default: the
+    # deck's first bucket) to date_to, each summing the `window` buckets ending there.
+    # Buckets without matches count as zero.
+    step = datetime.timedelta(days=TREND_BUCKET_DAYS[bucket])
+    date_to = date_to or datetime.datetime.utcnow().date()
+    DDS = models.DeckDailyStats
+    q = select(DDS).where(DDS.deck_id == deck_id, DDS.day <= date_to).order_by(DDS.day)
+    if date_from:
+        # earlier buckets feed the window of the first points
+        q = q.where(DDS.day >= bucket_start(date_from, bucket) - step * (window - 1))
+    rows = (await db.execute(q)).scalars().all()
+    if date_from is None:
+        if not rows:
+            return []
+        date_from = rows[0].day
+    buckets: Dict[datetime.date, Dict[str, int]] = {}
+    for r in rows:
+        acc = buckets.setdefault(bucket_start(r.day, bucket), dict.fromkeys(DAILY_COUNTERS, 0))
+        for k in DAILY_COUNTERS:
+            acc[k] += getattr(r, k)
+
+    first, last = bucket_start(date_from, bucket), bucket_start(date_to, bucket)
+    zero = dict.fromkeys(DAILY_COUNTERS, 0)
+    rolling = dict(zero)
+    points = []
+    b = first - step * (window - 1)
+    while b <= last:
+        for k, v in buckets.get(b, zero).items():
+            rolling[k] += v
+        leaving = buckets.get(b - step * window)
+        if leaving:
+            for k, v in leaving.items():
+                rolling[k] -= v
+        if b >= first:
+            points.append({"start": b, **rolling})
+        b += step
+    return points
+
@@ -1,6 +1,12 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy import text
+import asyncio
+import logging
 import os
+import time
 from dotenv import load_dotenv
+from . import metrics
 
 load_dotenv()
 
@@ -9,5 +15,152 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise RuntimeError("Set DATABASE_URL in environment")
 
-engine = create_async_engine(DATABASE_URL, echo=False)
+# optional streaming replica for read-only routes (get_read_db in main)
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
+# reads go to the primary while the replica is unreachable or further behind than this
+DB_READ_MAX_LAG = float(os.getenv("DB_READ_MAX_LAG", "5"))
+DB_READ_CHECK_INTERVAL = float(os.getenv("DB_READ_CHECK_INTERVAL", "2"))
+
+# connection pool settings
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "-1"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "false").lower() in ("1", "true", "yes")
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    # records how long each checkout waited for a connection
+    engine_name = "primary"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.DB_POOL_WAIT.observe(time.perf_counter() - start, engine=self.engine_name)
+
+
+def make_engine(url: str, name: str = "primary"):
+    # one pool class per engine, so waits are labelled with the engine's name
+    poolclass = InstrumentedPool if name == InstrumentedPool.engine_name else type(f"{name.title()}Pool", (InstrumentedPool,), {"engine_name": name})
+    return create_async_engine(
+        url,
+        echo=False,
+        poolclass=poolclass,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+
+
+engine = make_engine(DATABASE_URL)
 AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+
+metrics.registry.add_collector(lambda: metrics.observe_pool("primary", engine.pool))
+
+read_engine = make_engine(DATABASE_READ_URL, "replica") if DATABASE_READ_URL else None
+ReadSessionLocal = async_sessionmaker(read_engine, expire_on_commit=False, class_=AsyncSession) if read_engine else None
+
+if read_engine is not None:
+    metrics.registry.add_collector(lambda: metrics.observe_pool("replica", read_engine.pool))
+
+
+# Replica health: a background task measures replication lag every DB_READ_CHECK_INTERVAL
+# seconds. A replica that has replayed everything it received counts as current even when
+# its last replayed transaction is old (an idle primary).
+REPLICA_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+logger = logging.getLogger("app.database")
+
+
+class ReplicaMonitor:
+    def __init__(self, engine, max_lag: float, interval: float):
+        self.engine = engine
+        self.max_lag = max_lag
+        self.interval = interval
+        self.lag = None  # seconds; None while unreachable or not yet checked
+        self._task = None
+
+    @property
+    def healthy(self) -> bool:
+        return self.lag is not None and self.lag <= self.max_lag
+
+    async def _measure(self) -> float:
+        async with self.engine.connect() as conn:
+            return float(await conn.scalar(REPLICA_LAG_SQL))
+
+    async def check(self) -> None:
+        was_healthy = self.healthy
+        try:
+            self.lag = await asyncio.wait_for(self._measure(), self.interval)
+        except Exception as e:
+            self.lag = None
+            if was_healthy:
+                logger.warning("read replica unavailable, reading from the primary: %s", str(e).splitlines()[0] if str(e) else type(e).__name__)
+            # pooled connections to a restarted replica are dead; reconnect from scratch
+            await self.engine.dispose()
+        else:
+            if was_healthy and not self.healthy:
+                logger.warning("read replica %.1fs behind, reading from the primary", self.lag)
+        if self.healthy and not was_healthy:
+            logger.info("reading from the replica again (lag %.3fs)", self.lag)
+        metrics.DB_REPLICA_LAG.set(self.lag if self.lag is not None else -1)
+        metrics.DB_REPLICA_HEALTHY.set(1 if self.healthy else 0)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.check()
+
+    async def start(self) -> None:
+        # the first check runs before serving, so reads don't all start on the primary
+        await self.check()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+replica_monitor = ReplicaMonitor(read_engine, DB_READ_MAX_LAG, DB_READ_CHECK_INTERVAL) if read_engine else None
+
+
+# Read-your-writes: stats_cache / aggregate_cache keys are taken before the read, and a write
+# bumps the versions right after its commit. On the primary, a result filed under the new
+# version always includes the write. A replica that hasn't replayed it yet returns the data
+# from before the write, which would then be served under the new version (and its ETag) for
+# the cache's full TTL, long after the replica caught up. So results read from the replica
+# are cached for at most REPLICA_CACHE_TTL: the lag bound plus one check interval, the
+# longest the replica can fall behind before reads move to the primary. Within that window a
+# client may still see its own write missing.
+REPLICA_CACHE_TTL = DB_READ_MAX_LAG + DB_READ_CHECK_INTERVAL
+
+
+def read_cache_ttl(db: AsyncSession, ttl: float) -> float:
+    # how long to cache a result read through `db` (a get_read_db session)
+    if read_engine is not None and db.bind is read_engine:
+        return min(ttl, REPLICA_CACHE_TTL)
+    return ttl
+
+
+def read_sessionmaker() -> async_sessionmaker:
+    # the replica while it is reachable and current, otherwise the primary
+    if replica_monitor is not None and replica_monitor.healthy:
+        metrics.DB_READ_SESSIONS.inc(engine="replica")
+        return ReadSessionLocal
+    metrics.DB_READ_SESSIONS.inc(engine="primary")
+    return AsyncSessionLocal
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import os
+import time
+from typing import List, Optional, Tuple
+from . import crud, metrics, schemas
+from .database import AsyncSessionLocal
+
+# Group commit for POST /match (opt-in, MATCH_GROUP_COMMIT=1).
+#
+# Concurrent requests put their match on an in-process queue and wait. One writer task
+# takes whatever is queued, waits up to MATCH_GROUP_COMMIT_MAX_WAIT_MS for more (at most
+# MATCH_GROUP_COMMIT_MAX_BATCH matches), and inserts them all in one transaction through
+# crud.create_matches. Each caller is answered only after that transaction commits, so a
+# 200 still means the match is durable. If the transaction fails (say, one match names an
+# unknown deck), its matches are retried one per transaction and only the bad one fails.
+# If the writer task stops (cancelled at shutdown, or crashed), every caller still waiting
+# on it, in the batch being written or in the queue, gets IngestStopped instead of hanging.
+
+MATCH_GROUP_COMMIT = os.getenv("MATCH_GROUP_COMMIT", "false").lower() in ("1", "true", "yes")
+MATCH_GROUP_COMMIT_MAX_BATCH = int(os.getenv("MATCH_GROUP_COMMIT_MAX_BATCH", "200"))
+MATCH_GROUP_COMMIT_MAX_WAIT_MS = float(os.getenv("MATCH_GROUP_COMMIT_MAX_WAIT_MS", "5"))
+# callers wait on put() once this many matches are queued
+MATCH_GROUP_COMMIT_MAX_QUEUE = int(os.getenv("MATCH_GROUP_COMMIT_MAX_QUEUE", "10000"))
+
+logger = logging.getLogger("app.ingest")
+
+Pending = Tuple[schemas.MatchCreate, asyncio.Future, float]
+
+
+class IngestStopped(Exception):
+    pass
+
+
+def _fail(pending: List[Pending]) -> None:
+    for _, fut, _ in pending:
+        if not fut.done():
+            fut.set_exception(IngestStopped("match ingestion stopped"))
+
+
+class MatchBatcher:
+    def __init__(self, max_batch: int, max_wait: float, max_queue: int):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit(self, match_in: schemas.MatchCreate):
+        if self._worker is None or self._worker.done():
+            # created lazily so the queue and task belong to the running loop
+            self._queue = asyncio.Queue(self.max_queue)
+            self._worker = asyncio.create_task(self._run())
+        worker = self._worker
+        pending = (match_in, asyncio.get_running_loop().create_future(), time.perf_counter())
+        await self._queue.put(pending)
+        if worker.done():
+            # the writer stopped while this call waited for room in a full queue
+            _fail([pending])
+        return await pending[1]
+
+    async def stop(self) -> None:
+        # at shutdown, after in-flight requests finished; anything still queued is failed
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        _fail(self._drain())
+
+    def _drain(self) -> List[Pending]:
+        pending = []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        return pending
+
+    async def _next_batch(self, batch: List[Pending]) -> None:
+        # fills `batch` in place, so matches already taken off the queue are known on cancel
+        batch.append(await self._queue.get())
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+    async def _run(self) -> None:
+        batch: List[Pending] = []
+        try:
+            while True:
+                batch = []
+                await self._next_batch(batch)
+                # callers that went away (client disconnect) are dropped before the insert
+                batch = [p for p in batch if not p[1].done()]
+                if batch:
+                    await self._commit(batch)
+        finally:
+            # nothing will answer these callers any more; matches whose transaction
+            # committed were already answered and are skipped
+            _fail(batch + self._drain())
+
+    async def _commit(self, batch: List[Pending]) -> None:
+        start = time.perf_counter()
+        try:
+            async with AsyncSessionLocal() as db:
+                rows = await crud.create_matches(db, [m for m, _, _ in batch])
+                # answered before the session closes: a cancel during close must not
+                # report committed matches as failed
+                self._answer(batch, rows, start)
+        except Exception as e:
+            # a failure after the commit (closing the session) leaves nothing to retry
+            batch = [p for p in batch if not p[1].done()]
+            if len(batch) > 1:
+                logger.warning("group commit of %d matches failed (%s), retrying one by one", len(batch), type(e).__name__)
+                for pending in batch:
+                    await self._commit([pending])
+                return
+            for _, fut, _ in batch:
+                fut.set_exception(e)
+
+    def _answer(self, batch: List[Pending], rows: list, start: float) -> None:
+        metrics.MATCH_INGEST_BATCH_SIZE.observe(len(batch))
+        metrics.MATCH_INGEST_COMMIT.observe(time.perf_counter() - start)
+        done = time.perf_counter()
+        for (_, fut, queued), row in zip(batch, rows):
+            metrics.MATCH_INGEST_WAIT.observe(done - queued)
+            if not fut.done():
+                fut.set_result(row)
+
+
+match_batcher = MatchBatcher(MATCH_GROUP_COMMIT_MAX_BATCH, MATCH_GROUP_COMMIT_MAX_WAIT_MS / 1000, MATCH_GROUP_COMMIT_MAX_QUEUE)
+
+metrics.registry.add_collector(lambda: metrics.MATCH_INGEST_QUEUE_DEPTH.set(match_batcher.depth()))
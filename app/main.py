@@ -1,34 +1,66 @@
-from fastapi import FastAPI, HTTPException, Depends, Query, status
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, status
+from fastapi.responses import Response, StreamingResponse, PlainTextResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from . import database, models, schemas, crud
+from . import admission, database, models, schemas, crud, cache_bus, ingest, metrics, profiler, stats_engine
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 import asyncio
+import jwt
 import uvicorn
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
-from .database import AsyncSessionLocal, engine
+from .database import AsyncSessionLocal, engine, read_engine, read_sessionmaker, read_cache_ttl, replica_monitor
+from .cache import stats_cache, principal_cache, aggregate_cache, player_name_cache, normalize_play_draw
+from .auth import SECRET_KEY, ALGORITHM, PasswordHasherBusy, get_password_hash_async, verify_password_async, create_access_token
+from .utils import parse_iso_or_none, encode_cursor, decode_cursor, make_etag, etag_matches
 from sqlalchemy.exc import NoResultFound
+from pydantic import ValidationError
+import csv
+import io
 import json
+import os
 
 app = FastAPI(title="MTG Matchkeeping API")
+app.add_middleware(metrics.MetricsMiddleware)
+
+# debug mode: per-request query counts/time headers, slow-query plans, N+1 warnings
+if profiler.DB_PROFILE:
+    profiler.install(engine)
+    if read_engine is not None:
+        profiler.install(read_engine)
+    app.add_middleware(profiler.ProfilerMiddleware)
+
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "1000"))
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "50000"))
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "1000"))
+
+# with several workers: evict local cache entries on other workers' writes
+cache_bus_listener = cache_bus.CacheBusListener(cache_bus.listener_dsn(engine.url), cache_bus.CACHE_BUS_CHANNEL) if cache_bus.CACHE_BUS else None
 
 # Dependency for async DB session
 async def get_db():
     async with AsyncSessionLocal() as session:
         yield session
 
+# read-only routes: the replica (DATABASE_READ_URL) while it is reachable and within
+# DB_READ_MAX_LAG, otherwise the primary
+async def get_read_db():
+    async with read_sessionmaker()() as session:
+        yield session
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> schemas.Principal:
+    # cache hit: no decode and no query (the session is never used, so it never connects)
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        from .auth import SECRET_KEY, ALGORITHM
-        import jwt
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
         if email is None:
@@ -38,7 +70,46 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
     user = await crud.get_user_by_email(db, email=email)
     if user is None:
         raise credentials_exception
-    return user
+    principal = schemas.Principal.model_validate(user)
+    principal_cache.set(token, principal, expires_at=payload.get("exp"))
+    return principal
+
+# Admission control for analytics routes: per-client rate limit (429), then a route slot and
+# a global slot that leaves DB_WRITE_RESERVE pool connections to writes (503 when shed)
+def rate_limit_key(request: Request) -> str:
+    # one bucket per user, keyed on the token's `sub` (the email) whether or not the principal
+    # is cached; only called with ANALYTICS_RATE_LIMIT set, and a cached principal skips the decode
+    auth = request.headers.get("authorization", "")
+    token = auth[7:] if auth[:7].lower() == "bearer " else None
+    if token:
+        principal = principal_cache.get(token)
+        if principal is not None:
+            return f"user:{principal.email}"
+        try:
+            return f"user:{jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])['sub']}"
+        except (jwt.InvalidTokenError, KeyError):
+            pass
+    return f"ip:{request.client.host if request.client else ''}"
+
+def analytics(route: str):
+    async def admit(request: Request):
+        try:
+            if admission.rate_limits is not None:
+                admission.check_rate(rate_limit_key(request), route)
+            slot = await admission.acquire(route)
+        except admission.RateLimited as e:
+            raise HTTPException(status_code=429, detail="Rate limit exceeded", headers={"Retry-After": str(e.retry_after)})
+        except admission.AnalyticsBusy as e:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Analytics capacity exhausted, retry shortly",
+                headers={"Retry-After": str(e.retry_after)},
+            )
+        try:
+            yield
+        finally:
+            slot.release()
+    return admit
 
 # --- Startup: create tables (simple approach) ---
 @app.on_event("startup")
@@ -46,8 +117,28 @@ async def startup():
     async with engine.begin() as conn:
         # NOTE: in production use Alembic instead of create_all
         await conn.run_sync(models.Base.metadata.create_all)
+    if cache_bus_listener is not None:
+        await cache_bus_listener.start()
+    if replica_monitor is not None:
+        await replica_monitor.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await ingest.match_batcher.stop()
+    if cache_bus_listener is not None:
+        await cache_bus_listener.stop()
+    if replica_monitor is not None:
+        await replica_monitor.stop()
 
 # --- Auth endpoints ---
+def hasher_busy_exception() -> HTTPException:
+    # every bcrypt slot stayed busy for PASSWORD_HASH_QUEUE_TIMEOUT; shed instead of piling up
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Authentication is busy, retry shortly",
+        headers={"Retry-After": "1"},
+    )
+
 @app.post("/register", response_model=schemas.UserOut)
 async def register(user_in: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
     existing_user = await crud.get_user_by_email(db, email=user_in.email)
@@ -58,8 +149,12 @@ async def register(user_in: schemas.UserCreate, db: AsyncSession = Depends(get_d
     if existing_username:
         raise HTTPException(status_code=400, detail="Username already registered")
     
-    from .auth import get_password_hash
-    hashed_password = get_password_hash(user_in.password)
+    # hand the pooled connection back while bcrypt runs; the session reconnects for the insert
+    await db.close()
+    try:
+        hashed_password = await get_password_hash_async(user_in.password)
+    except PasswordHasherBusy:
+        raise hasher_busy_exception()
     user = await crud.create_user(db, user_in, hashed_password)
     return user
 
@@ -71,8 +166,13 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     if not user:
         user = await crud.get_user_by_username(db, username=form_data.username)
         
-    from .auth import verify_password, create_access_token
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    # hand the pooled connection back while bcrypt runs
+    await db.close()
+    try:
+        verified = bool(user) and await verify_password_async(form_data.password, user.hashed_password)
+    except PasswordHasherBusy:
+        raise hasher_busy_exception()
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -81,113 +181,406 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     access_token = create_access_token(data={"sub": user.email})
     return {"access_token": access_token, "token_type": "bearer"}
 
+# --- Keyset pagination helpers ---
+def parse_cursor(cursor: Optional[str]):
+    try:
+        return decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def next_cursor(items: list, has_more: bool) -> Optional[str]:
+    if not has_more or not items:
+        return None
+    return encode_cursor(items[-1].created_at, items[-1].id)
+
 # --- Deck endpoints ---
 @app.post("/deck", response_model=schemas.DeckOut)
-async def create_deck(deck_in: schemas.DeckCreate, db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+async def create_deck(deck_in: schemas.DeckCreate, db: AsyncSession = Depends(get_db), current_user: schemas.Principal = Depends(get_current_user)):
     deck = await crud.create_deck(db, deck_in, user_id=current_user.id)
     return deck
 
+@app.get("/decks", response_model=schemas.DeckPage)
+async def list_decks(
+    user_id: Optional[str] = Query(None, description="only decks owned by this user"),
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    decks, has_more = await crud.get_decks(db, user_id=user_id, limit=limit, after=parse_cursor(cursor))
+    return schemas.DeckPage(items=decks, next_cursor=next_cursor(decks, has_more))
+
+# Conditional GET on deck reads and stats: clients may store responses but revalidate each time
+def not_modified(request: Request, response: Response, etag: str) -> bool:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return etag_matches(request.headers.get("if-none-match"), etag)
+
+def not_modified_response(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
 @app.get("/deck/{deck_id}", response_model=schemas.DeckOut)
-async def get_deck(deck_id: str, db: AsyncSession = Depends(get_db)):
+async def get_deck(deck_id: str, request: Request, response: Response, db: AsyncSession = Depends(get_read_db)):
     deck = await crud.get_deck(db, deck_id)
     if not deck:
         raise HTTPException(status_code=404, detail="Deck not found")
+    # decks aren't updated after creation
+    etag = make_etag("deck", deck.id, deck.created_at)
+    if not_modified(request, response, etag):
+        return not_modified_response(etag)
     return deck
 
 # decklist create (not in original minimal spec but useful)
 @app.post("/decklist", response_model=schemas.DecklistOut)
-async def create_decklist(decklist_in: schemas.DecklistCreate, db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+async def create_decklist(decklist_in: schemas.DecklistCreate, db: AsyncSession = Depends(get_db), current_user: schemas.Principal = Depends(get_current_user)):
     # expecting MTGO format
     dl = await crud.create_decklist(db, decklist_in, user_id=current_user.id)
     return dl
 
-@app.get("/deck/{deck_id}/stats", response_model=schemas.DeckStats)
-async def deck_stats(deck_id: str, db: AsyncSession = Depends(get_db)):
-    matches = await crud.get_matches_for_deck(db, deck_id)
-    stats = crud.compute_deck_stats(matches)
+# confidence intervals (ci=true on the stats / winrate endpoints)
+CI_RESAMPLES = int(os.getenv("CI_RESAMPLES", "10000"))
+CI_SEED = int(os.getenv("CI_SEED", "0"))
+
+@app.get("/deck/{deck_id}/stats", response_model=schemas.DeckStats, dependencies=[Depends(analytics("stats"))])
+async def deck_stats(
+    deck_id: str,
+    request: Request,
+    response: Response,
+    ci: bool = Query(False, description="add Wilson and bootstrap confidence intervals"),
+    confidence: float = Query(0.95, gt=0, lt=1),
+    resamples: int = Query(CI_RESAMPLES, ge=100, le=100000, description="bootstrap resamples"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    params = {"confidence": confidence, "resamples": resamples} if ci else None
+    cache_key = stats_cache.key("stats", deck_id, params)
+    # cached as (etag, DeckStats); a cache hit answers If-None-Match without any query
+    cached = stats_cache.get(cache_key)
+    if cached is not None:
+        etag, result = cached
+        if not_modified(request, response, etag):
+            return not_modified_response(etag)
+        return result
+    etag = make_etag("stats", deck_id, await crud.get_deck_marker(db, deck_id), sorted((params or {}).items()))
+    if not_modified(request, response, etag):
+        return not_modified_response(etag)
+    # one primary-key read of the running counters maintained by crud.create_match
+    # (the marker read above already loaded the row)
+    stats = crud.stats_from_rollup(await crud.get_deck_rollup(db, deck_id))
+    intervals = None
+    if ci:
+        # the bootstrap needs per-match outcomes, grouped down to a few (wins, games) patterns
+        patterns = await crud.get_game_patterns(db, deck_id)
+        intervals = stats_engine.deck_intervals(patterns, confidence, resamples, CI_SEED)
+    result = deck_stats_out(stats, intervals)
+    stats_cache.set(cache_key, (etag, result), ttl=read_cache_ttl(db, stats_cache.ttl))
+    return result
+
+def deck_stats_out(stats, intervals=None) -> schemas.DeckStats:
     return schemas.DeckStats(
         total_matches=stats["total_matches"],
         total_games=stats["total_games"],
         match_winrate=stats["match_winrate"],
         game_winrate=stats["game_winrate"],
         by_play_draw=stats["by_play_draw"],
-        mulligan_stats=stats["mulligan_stats"]
+        mulligan_stats=stats["mulligan_stats"],
+        confidence_intervals=intervals,
     )
 
+DECK_STATS_BATCH_MAX = int(os.getenv("DECK_STATS_BATCH_MAX", "500"))
+
+@app.post("/decks/stats", response_model=schemas.DeckStatsBatch, dependencies=[Depends(analytics("decks_stats"))])
+async def deck_stats_batch(req: schemas.DeckStatsBatchRequest, db: AsyncSession = Depends(get_read_db)):
+    deck_ids = list(dict.fromkeys(req.deck_ids))
+    if len(deck_ids) > DECK_STATS_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {DECK_STATS_BATCH_MAX} decks per request")
+    window = {"time_from": req.time_from, "time_to": req.time_to} if req.time_from or req.time_to else None
+    # same cache entries as /deck/{id}/stats (without a window); only the misses are queried
+    keys = {deck_id: stats_cache.key("stats", deck_id, window) for deck_id in deck_ids}
+    results = {}
+    for deck_id, key in keys.items():
+        hit = stats_cache.get(key)
+        if hit is not None:
+            results[deck_id] = hit[1]
+    missing = [deck_id for deck_id in deck_ids if deck_id not in results]
+    if missing:
+        if window:
+            # one fetch of the window's per-game arrays for all missing decks
+            # (windowed entries are never served with an ETag)
+            arrays = await crud.get_match_arrays_for_decks(db, missing, req.time_from, req.time_to)
+            computed = {deck_id: (None, crud.compute_deck_stats_np(a)) for deck_id, a in arrays.items()}
+        else:
+            # one IN (...) read of the running counters
+            rollups = await crud.get_deck_rollups(db, missing)
+            computed = {
+                deck_id: (make_etag("stats", deck_id, marker, []), crud.stats_from_rollup(c))
+                for deck_id, (c, marker) in rollups.items()
+            }
+        for deck_id, (etag, stats) in computed.items():
+            results[deck_id] = deck_stats_out(stats)
+            stats_cache.set(keys[deck_id], (etag, results[deck_id]), ttl=read_cache_ttl(db, stats_cache.ttl))
+    return schemas.DeckStatsBatch(stats={deck_id: results[deck_id] for deck_id in deck_ids})
+
 # winrate endpoint with query filtering
-@app.get("/deck/{deck_id}/winrate", response_model=schemas.WinrateResponse)
+@app.get("/deck/{deck_id}/winrate", response_model=schemas.WinrateResponse, dependencies=[Depends(analytics("winrate"))])
 async def deck_winrate(
     deck_id: str,
+    request: Request,
+    response: Response,
     time_from: Optional[str] = Query(None, description="ISO datetime"),
     time_to: Optional[str] = Query(None, description="ISO datetime"),
-    game: Optional[int] = Query(None, description="which game (1-based). if omitted, match winrate is used"),
+    game: Optional[int] = Query(None, ge=1, description="which game (1-based). if omitted, match winrate is used"),
     player_mulligan_lte: Optional[int] = Query(None),
     opponent_mulligan_lte: Optional[int] = Query(None),
     play_draw: Optional[str] = Query(None, description="play/draw/neither"),
-    db: AsyncSession = Depends(get_db)
+    card: Optional[str] = Query(None, description="only matches whose decklist plays this card"),
+    card_min_quantity: int = Query(1, ge=1, description="with the card filter: at least this many copies"),
+    card_board: str = Query("main", pattern="^(main|side)$", description="with the card filter: main or side"),
+    ci: bool = Query(False, description="add Wilson and bootstrap confidence intervals"),
+    confidence: float = Query(0.95, gt=0, lt=1),
+    resamples: int = Query(CI_RESAMPLES, ge=100, le=100000, description="bootstrap resamples"),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    # load matches
-    from dateutil import parser
-    tf = parser.isoparse(time_from) if time_from else None
-    tt = parser.isoparse(time_to) if time_to else None
-
-    matches = await crud.get_matches_for_deck(db, deck_id, time_from=tf, time_to=tt)
-
-    # filtering
-    filtered = []
-    for m in matches:
-        ok = True
-        # mulligan filters: compare totals or per-game? I'll apply to first game's mulligan when provided
-        if player_mulligan_lte is not None and m.mulligan_array:
-            # check if any game exceed threshold
-            if any(int(x) > player_mulligan_lte for x in m.mulligan_array):
-                ok = False
-        if opponent_mulligan_lte is not None:
-            # No explicit opponent mulligan field in schema: skipping unless provided separately (we did not store opponent mulligans)
-            pass
+    try:
+        tf = parse_iso_or_none(time_from)
+        tt = parse_iso_or_none(time_to)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid time_from / time_to")
+
+    filters = dict(
+        time_from=tf,
+        time_to=tt,
+        player_mulligan_lte=player_mulligan_lte,
+        opponent_mulligan_lte=opponent_mulligan_lte,
+        play_draw=normalize_play_draw(play_draw),
+    )
+    if card and card.strip():
+        filters.update(card=crud.card_key(card), card_min_quantity=card_min_quantity, card_board=card_board)
+    ci_params = {"confidence": confidence, "resamples": resamples} if ci else {}
+    params = {**filters, "game": game, **ci_params}
+    cache_key = stats_cache.key("winrate", deck_id, params)
+    # cached as (etag, WinrateResponse), as for /deck/{id}/stats
+    cached = stats_cache.get(cache_key)
+    if cached is not None:
+        etag, winrate = cached
+        if not_modified(request, response, etag):
+            return not_modified_response(etag)
+        return winrate
+    etag = make_etag("winrate", deck_id, await crud.get_deck_marker(db, deck_id), sorted(params.items()))
+    if not_modified(request, response, etag):
+        return not_modified_response(etag)
+
+    # filtering and aggregation happen in a single SQL statement
+    result = await crud.get_deck_winrate(db, deck_id, game=game, **filters)
+    interval = None
+    if ci:
+        # one success or failure per match (or per played game N), so the counts are enough
+        wins, total = result["wins"], result["total"]
+        boot, = stats_engine.bootstrap_intervals([stats_engine.binary_patterns(wins, total)], confidence, resamples, CI_SEED)
+        interval = schemas.ConfidenceInterval(
+            confidence=confidence,
+            wilson=stats_engine.wilson_interval(wins, total, confidence),
+            bootstrap=boot,
+        )
+    winrate = schemas.WinrateResponse(winrate=result["winrate"], confidence_interval=interval)
+    stats_cache.set(cache_key, (etag, winrate), ttl=read_cache_ttl(db, stats_cache.ttl))
+    return winrate
+
+# winrate over time from the daily buckets
+TREND_MAX_POINTS = int(os.getenv("TREND_MAX_POINTS", "3660"))
+
+def _rate(wins: int, total: int) -> Optional[float]:
+    return (wins / total) if total > 0 else None
+
+@app.get("/deck/{deck_id}/trend", response_model=schemas.TrendResponse, dependencies=[Depends(analytics("trend"))])
+async def deck_trend(
+    deck_id: str,
+    bucket: str = Query("day", pattern="^(day|week)$"),
+    window: int = Query(1, ge=1, le=365, description="buckets per rolling window"),
+    time_from: Optional[str] = Query(None, description="ISO date; defaults to the deck's first match"),
+    time_to: Optional[str] = Query(None, description="ISO date; defaults to today (UTC)"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    try:
+        date_from = parse_iso_or_none(time_from)
+        date_to = parse_iso_or_none(time_to)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid time_from / time_to")
+    date_from = date_from.date() if date_from else None
+    date_to = date_to.date() if date_to else datetime.utcnow().date()
+    if date_from and (date_to - date_from).days // crud.TREND_BUCKET_DAYS[bucket] >= TREND_MAX_POINTS:
+        raise HTTPException(status_code=400, detail=f"At most {TREND_MAX_POINTS} points per request")
+
+    cache_key = stats_cache.key("trend", deck_id, {"bucket": bucket, "window": window, "from": date_from, "to": date_to})
+    cached = stats_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    points = await crud.get_deck_trend(db, deck_id, bucket=bucket, window=window, date_from=date_from, date_to=date_to)
+    response = schemas.TrendResponse(bucket=bucket, window=window, points=[
+        schemas.TrendPoint(
+            start=p["start"],
+            total_matches=p["total_matches"],
+            match_wins=p["match_wins"],
+            total_games=p["total_games"],
+            game_wins=p["game_wins"],
+            match_winrate=_rate(p["match_wins"], p["total_matches"]),
+            game_winrate=_rate(p["game_wins"], p["total_games"]),
+            by_play_draw={k: _rate(p[f"{k}_wins"], p[f"{k}_games"]) for k in ("play", "draw", "neither")},
+        )
+        for p in points[-TREND_MAX_POINTS:]
+    ])
+    stats_cache.set(cache_key, response, ttl=read_cache_ttl(db, stats_cache.ttl))
+    return response
+
+@app.get("/deck/{deck_id}/matches", response_model=schemas.MatchPage)
+async def list_deck_matches(
+    deck_id: str,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    matches, has_more = await crud.get_matches_page(db, deck_id=deck_id, limit=limit, after=parse_cursor(cursor))
+    return schemas.MatchPage(items=matches, next_cursor=next_cursor(matches, has_more))
+
+# streaming export of a deck's full match history
+EXPORT_COLUMNS = [c.name for c in models.Match.__table__.columns]
+
+def _export_cell(v):
+    if isinstance(v, datetime):
+        return v.isoformat()
+    return v
 
-        # play/draw filter: check if any game matches the play_draw param
-        if play_draw and m.play_draw_array:
-            normalized = [ (p.lower()[0] if p else "n") for p in m.play_draw_array ]
-            # If the user requested 'play' ensure the match had at least one game where play/draw == play
-            if play_draw.lower().startswith("p"):
-                if not any(p=='p' for p in normalized):
-                    ok = False
-            elif play_draw.lower().startswith("d"):
-                if not any(p=='d' for p in normalized):
-                    ok = False
+async def _export_chunks(deck_id: str, fmt: str, tf: Optional[datetime], tt: Optional[datetime]):
+    # own session: the response body is produced after the endpoint (and its dependencies) return
+    async with read_sessionmaker()() as db:
+        if fmt == "csv":
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            writer.writerow(EXPORT_COLUMNS)
+            yield buf.getvalue()
+        async for rows in crud.stream_matches_for_deck(db, deck_id, time_from=tf, time_to=tt, chunk_size=EXPORT_CHUNK_SIZE):
+            if fmt == "csv":
+                buf = io.StringIO()
+                writer = csv.writer(buf)
+                for row in rows:
+                    # array / JSON columns are written as JSON text
+                    writer.writerow([
+                        json.dumps(v) if isinstance(v, (list, dict)) else _export_cell(v)
+                        for v in (row._mapping[c] for c in EXPORT_COLUMNS)
+                    ])
+                yield buf.getvalue()
             else:
-                # neither: matches that didn't play nor draw anywhere
-                if any(p in ('p','d') for p in normalized):
-                    ok = False
+                yield "".join(
+                    json.dumps({c: _export_cell(row._mapping[c]) for c in EXPORT_COLUMNS}) + "\n"
+                    for row in rows
+                )
 
-        if not ok:
-            continue
-        filtered.append(m)
-
-    # Compute winrate depending on `game` param
-    if game is None:
-        # default: match winrate
-        match_wins = 0
-        for m in filtered:
-            games = m.game_win_array or []
-            if sum(int(g) for g in games) >= 2:
-                match_wins += 1
-        total = len(filtered)
-        winrate = (match_wins/total) if total>0 else 0.0
-    else:
-        # game-specific winrate: game param is 1-based
-        idx = game - 1
-        total = 0
-        wins = 0
-        for m in filtered:
-            games = m.game_win_array or []
-            if idx < len(games):
-                total += 1
-                wins += int(games[idx])
-        winrate = (wins/total) if total>0 else 0.0
-
-    return schemas.WinrateResponse(winrate=winrate)
+@app.get("/deck/{deck_id}/matches/export")
+async def export_deck_matches(
+    deck_id: str,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    time_from: Optional[str] = Query(None, description="ISO datetime"),
+    time_to: Optional[str] = Query(None, description="ISO datetime"),
+):
+    try:
+        tf = parse_iso_or_none(time_from)
+        tt = parse_iso_or_none(time_to)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid time_from / time_to")
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        _export_chunks(deck_id, format, tf, tt),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="deck-{deck_id}-matches.{format}"'},
+    )
+
+# --- Format-wide endpoints ---
+@app.get("/matchups", response_model=schemas.MatchupMatrix, dependencies=[Depends(analytics("matchups"))])
+async def matchups(
+    format: Optional[str] = Query(None, description="deck format, e.g. Modern"),
+    time_from: Optional[str] = Query(None, description="ISO datetime"),
+    time_to: Optional[str] = Query(None, description="ISO datetime"),
+    cached: bool = Query(True, description="serve a cached matrix if no match was recorded since"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    try:
+        tf = parse_iso_or_none(time_from)
+        tt = parse_iso_or_none(time_to)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid time_from / time_to")
+    # rows are grouped by the deck side's format, so only that format's matches invalidate it
+    version = stats_cache.format_version(format) if format else stats_cache.data_version
+    cache_key = ("matchups", version, format, tf, tt)
+    if cached:
+        hit = aggregate_cache.get(cache_key)
+        if hit is not None:
+            return hit
+
+    rows = await crud.get_matchups(db, format=format, time_from=tf, time_to=tt)
+    names = {}
+    for r in rows:
+        names[r.deck_id] = r.deck_name
+        names[r.opponent_deck_id] = r.opponent_deck_name
+    deck_ids = sorted(names, key=lambda k: (names[k], k))
+    pos = {k: i for i, k in enumerate(deck_ids)}
+    n = len(deck_ids)
+    counts = [[0] * n for _ in range(n)]
+    match_wr = [[None] * n for _ in range(n)]
+    game_wr = [[None] * n for _ in range(n)]
+    for r in rows:
+        i, j = pos[r.deck_id], pos[r.opponent_deck_id]
+        counts[i][j] = r.matches
+        match_wr[i][j] = r.match_wins / r.matches
+        game_wr[i][j] = (r.game_wins / r.games) if r.games else None
+    result = schemas.MatchupMatrix(
+        deck_ids=deck_ids,
+        deck_names=[names[k] for k in deck_ids],
+        matches=counts,
+        match_winrate=match_wr,
+        game_winrate=game_wr,
+    )
+    aggregate_cache.set(cache_key, result, ttl=read_cache_ttl(db, aggregate_cache.ttl))
+    return result
+
+@app.get("/metagame", response_model=schemas.Metagame, dependencies=[Depends(analytics("metagame"))])
+async def metagame(
+    format: Optional[str] = Query(None, description="deck format, e.g. Modern; all formats if omitted"),
+    time_from: Optional[str] = Query(None, description="ISO datetime"),
+    time_to: Optional[str] = Query(None, description="ISO datetime"),
+    cached: bool = Query(True, description="serve a cached snapshot if no match was recorded in the format since"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    try:
+        tf = parse_iso_or_none(time_from)
+        tt = parse_iso_or_none(time_to)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid time_from / time_to")
+    # only matches of this format's decks invalidate the snapshot
+    version = stats_cache.format_version(format) if format else stats_cache.data_version
+    cache_key = ("metagame", version, format, tf, tt)
+    if cached:
+        hit = aggregate_cache.get(cache_key)
+        if hit is not None:
+            return hit
+
+    rows = await crud.get_metagame(db, format=format, time_from=tf, time_to=tt)
+    rows = [r for r in rows if r.matches]
+    total = sum(r.matches for r in rows)
+    decks = [
+        schemas.MetagameDeck(
+            deck_id=r.deck_id,
+            deck_name=r.deck_name,
+            matches=r.matches,
+            share=r.matches / total,
+            match_wins=r.match_wins,
+            match_winrate=r.match_wins / r.matches,
+            games=r.games,
+            game_wins=r.game_wins,
+            game_winrate=(r.game_wins / r.games) if r.games else None,
+        )
+        for r in sorted(rows, key=lambda r: (-r.matches, r.deck_name, r.deck_id))
+    ]
+    result = schemas.Metagame(format=format, time_from=tf, time_to=tt, total_matches=total, decks=decks)
+    aggregate_cache.set(cache_key, result, ttl=read_cache_ttl(db, aggregate_cache.ttl))
+    return result
 
 # --- Player endpoints ---
 @app.post("/player", response_model=schemas.PlayerOut)
@@ -195,24 +588,135 @@ async def create_player(player_in: schemas.PlayerCreate, db: AsyncSession = Depe
     p = await crud.create_player(db, player_in)
     return p
 
-# @app.get("/players", response_model=List[schemas.PlayerOut])
-# async def list_players(
-#     skip: int = Query(0, ge=0),
-#     limit: int = Query(100, ge=1, le=500),
-#     db: AsyncSession = Depends(get_db)
-# ):
-#     players = await crud.get_players(db, skip=skip, limit=limit)
-#     return players
+@app.get("/players", response_model=schemas.PlayerPage)
+async def list_players(
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    players, has_more = await crud.get_players(db, limit=limit, after=parse_cursor(cursor))
+    return schemas.PlayerPage(items=players, next_cursor=next_cursor(players, has_more))
+
+PLAYER_LOOKUP_MAX_NAMES = int(os.getenv("PLAYER_LOOKUP_MAX_NAMES", "1000"))
+
+@app.get("/player/lookup", response_model=schemas.PlayerLookup)
+async def lookup_players(
+    mtgo: List[str] = Query([], description="MTGO username; repeat for several"),
+    arena: List[str] = Query([], description="Arena username; repeat for several"),
+    # the primary: a lagging replica would cache a just-created player's names as unknown
+    db: AsyncSession = Depends(get_db)
+):
+    if len(mtgo) + len(arena) > PLAYER_LOOKUP_MAX_NAMES:
+        raise HTTPException(status_code=400, detail=f"At most {PLAYER_LOOKUP_MAX_NAMES} names per request")
+    return schemas.PlayerLookup(
+        mtgo=await crud.lookup_players(db, "mtgo", mtgo) if mtgo else {},
+        arena=await crud.lookup_players(db, "arena", arena) if arena else {},
+    )
+
+@app.get("/player/{player_id}/matches", response_model=schemas.MatchPage)
+async def list_player_matches(
+    player_id: str,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    matches, has_more = await crud.get_matches_page(db, player_id=player_id, limit=limit, after=parse_cursor(cursor))
+    return schemas.MatchPage(items=matches, next_cursor=next_cursor(matches, has_more))
 
 # --- Match endpoints ---
-@app.post("/match", response_model=schemas.MatchOut)
-async def create_match(match_in: schemas.MatchCreate, db: AsyncSession = Depends(get_db)):
+def match_input_error(match_in: schemas.MatchCreate) -> Optional[str]:
     # basic validation: at least two game in game_win_array
     if not match_in.game_win_array or len(match_in.game_win_array) < 2:
-        raise HTTPException(status_code=400, detail="game_win_array must have at least one element")
+        return "game_win_array must have at least one element"
+    return None
+
+@app.post("/match", response_model=schemas.MatchOut)
+async def create_match(match_in: schemas.MatchCreate, db: AsyncSession = Depends(get_db)):
+    error = match_input_error(match_in)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+    if ingest.MATCH_GROUP_COMMIT:
+        # acknowledged once the group-commit transaction holding this match commits
+        try:
+            return await ingest.match_batcher.submit(match_in)
+        except ingest.IngestStopped:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Match ingestion is stopping, retry shortly",
+                headers={"Retry-After": "1"},
+            )
     m = await crud.create_match(db, match_in)
     return m
 
+def _parse_bulk_body(body: bytes, content_type: str) -> list:
+    # JSON array of MatchCreate objects, or NDJSON with one object per line
+    try:
+        if "ndjson" in content_type or "jsonlines" in content_type:
+            return [json.loads(line) for line in body.decode("utf-8").splitlines() if line.strip()]
+        items = json.loads(body)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid request body: {e}")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of matches")
+    return items
+
+@app.post("/matches/bulk", response_model=schemas.BulkMatchResult)
+async def create_matches_bulk(request: Request, db: AsyncSession = Depends(get_db)):
+    items = _parse_bulk_body(await request.body(), request.headers.get("content-type", ""))
+    if len(items) > BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_MAX_ITEMS} matches per request")
+
+    # validate everything up front; only valid items are inserted
+    errors = []
+    valid = []
+    for idx, item in enumerate(items):
+        try:
+            match_in = schemas.MatchCreate.model_validate(item)
+        except ValidationError as e:
+            detail = "; ".join(f"{'.'.join(str(l) for l in err['loc'])}: {err['msg']}" for err in e.errors())
+            errors.append(schemas.BulkMatchError(index=idx, detail=detail))
+            continue
+        error = match_input_error(match_in)
+        if error:
+            errors.append(schemas.BulkMatchError(index=idx, detail=error))
+            continue
+        valid.append((idx, match_in))
+
+    missing = await crud.find_missing_references(db, [m for _, m in valid])
+    to_insert = []
+    for pos, (idx, match_in) in enumerate(valid):
+        if pos in missing:
+            errors.append(schemas.BulkMatchError(index=idx, detail=missing[pos]))
+        else:
+            to_insert.append(match_in)
+
+    created_ids = await crud.create_matches_bulk(db, to_insert, batch_size=BULK_BATCH_SIZE) if to_insert else []
+    errors.sort(key=lambda e: e.index)
+    return schemas.BulkMatchResult(created_ids=created_ids, errors=errors)
+
+@app.get("/cache/stats")
+async def cache_stats():
+    # hit/miss/eviction counters for sizing the in-process caches
+    return {
+        "stats_cache": stats_cache.stats(),
+        "aggregate_cache": aggregate_cache.stats(),
+        "principal_cache": principal_cache.stats(),
+        "player_name_cache": player_name_cache.stats(),
+    }
+
+def _collect_cache_metrics():
+    metrics.observe_cache("stats", stats_cache.entries)
+    metrics.observe_cache("aggregate", aggregate_cache)
+    metrics.observe_cache("principal", principal_cache.entries)
+    metrics.observe_cache("player_name", player_name_cache)
+
+metrics.registry.add_collector(_collect_cache_metrics)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    # Prometheus text exposition format
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/")
 async def root():
     return {"status": "ok"}
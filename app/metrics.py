@@ -0,0 +1,254 @@
+import time
+from functools import wraps
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Minimal Prometheus text-format metrics, no external dependencies.
+# Updates happen on the event loop thread (the pool hooks run in its greenlet),
+# so there is no locking.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self.values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def set_total(self, value: float, **labels) -> None:
+        # for counts kept elsewhere (e.g. cache stats) and mirrored at scrape time
+        self.values[_label_key(labels)] = value
+
+    def render(self) -> List[str]:
+        return self.header() + [f"{self.name}{_fmt_labels(k)} {_fmt_value(v)}" for k, v in self.values.items()]
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self.values: Dict[LabelKey, float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        self.values[_label_key(labels)] = value
+
+    def render(self) -> List[str]:
+        return self.header() + [f"{self.name}{_fmt_labels(k)} {_fmt_value(v)}" for k, v in self.values.items()]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # label key -> (per-bucket counts, sum, count)
+        self.series: Dict[LabelKey, List] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        s = self.series.get(key)
+        if s is None:
+            s = self.series[key] = [[0] * len(self.buckets), 0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                s[0][i] += 1
+                break
+        s[1] += value
+        s[2] += 1
+
+    def time(self, **labels) -> Callable:
+        # decorator for sync functions
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - start, **labels)
+            return wrapper
+        return decorator
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, (counts, total, count) in self.series.items():
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                lines.append(f"{self.name}_bucket{_fmt_labels(key, ('le', _fmt_value(bound)))} {cumulative}")
+            lines.append(f"{self.name}_sum{_fmt_labels(key)} {_fmt_value(total)}")
+            lines.append(f"{self.name}_count{_fmt_labels(key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+        # callables run at scrape time to refresh gauges (pool state, cache sizes)
+        self.collectors: List[Callable[[], None]] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self.register(Counter(name, help))
+
+    def gauge(self, name: str, help: str) -> Gauge:
+        return self.register(Gauge(name, help))
+
+    def histogram(self, name: str, help: str, buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, buckets))
+
+    def add_collector(self, fn: Callable[[], None]) -> None:
+        self.collectors.append(fn)
+
+    def render(self) -> str:
+        for fn in self.collectors:
+            fn()
+        lines: List[str] = []
+        for m in self.metrics:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# --- HTTP ---
+HTTP_REQUESTS = registry.counter("http_requests_total", "HTTP requests by route template, method and status")
+HTTP_LATENCY = registry.histogram("http_request_duration_seconds", "HTTP request latency by route template and method, including the streamed body")
+
+# --- DB pool ---
+DB_POOL_SIZE = registry.gauge("db_pool_size", "Configured pool size")
+DB_POOL_CHECKED_OUT = registry.gauge("db_pool_checked_out", "Connections currently checked out")
+DB_POOL_CHECKED_IN = registry.gauge("db_pool_checked_in", "Idle connections in the pool")
+DB_POOL_OVERFLOW = registry.gauge("db_pool_overflow", "Connections open beyond pool_size (negative while the pool is still filling)")
+DB_POOL_WAIT = registry.histogram(
+    "db_pool_wait_seconds", "Time to obtain a connection from the pool",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+DB_REPLICA_LAG = registry.gauge("db_replica_lag_seconds", "Read replica replication lag at the last check (-1 while unreachable)")
+DB_REPLICA_HEALTHY = registry.gauge("db_replica_healthy", "1 while reads are routed to the replica")
+DB_READ_SESSIONS = registry.counter("db_read_sessions_total", "Read-only sessions opened, by the engine serving them")
+
+# --- application hot paths ---
+STATS_COMPUTE = registry.histogram(
+    "stats_compute_seconds", "compute_deck_stats duration by implementation",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+)
+PASSWORD_HASH = registry.histogram("password_hash_seconds", "bcrypt hash/verify duration")
+PASSWORD_HASH_WAIT = registry.histogram("password_hash_queue_wait_seconds", "Wait for a bcrypt slot")
+PASSWORD_HASH_REJECTED = registry.counter("password_hash_rejected_total", "bcrypt calls shed after the queue timeout")
+
+# --- admission control (analytics routes) ---
+ADMISSION_IN_FLIGHT = registry.gauge("admission_in_flight", "Analytics requests running, per route and overall (route=\"all\")")
+ADMISSION_QUEUED = registry.gauge("admission_queued", "Analytics requests waiting for a slot, per route and overall")
+ADMISSION_WAIT = registry.histogram(
+    "admission_wait_seconds", "Time an admitted analytics request waited for its slots",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+ADMISSION_REJECTED = registry.counter("admission_rejected_total", "Analytics requests shed (503) or rate limited (429), by route and reason")
+
+# --- match ingestion (app.ingest group commit) ---
+MATCH_INGEST_QUEUE_DEPTH = registry.gauge("match_ingest_queue_depth", "POST /match requests waiting for a group commit")
+MATCH_INGEST_BATCH_SIZE = registry.histogram(
+    "match_ingest_batch_size", "Matches per group-commit transaction",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+MATCH_INGEST_COMMIT = registry.histogram("match_ingest_commit_seconds", "Group-commit transaction duration, including the insert")
+MATCH_INGEST_WAIT = registry.histogram(
+    "match_ingest_wait_seconds", "Time from enqueue to acknowledgement of one match",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+
+# --- caches ---
+CACHE_HITS = registry.counter("cache_hits_total", "Cache hits")
+CACHE_MISSES = registry.counter("cache_misses_total", "Cache misses")
+CACHE_EVICTIONS = registry.counter("cache_evictions_total", "LRU evictions")
+CACHE_SIZE = registry.gauge("cache_size", "Entries currently cached")
+CACHE_BUS_EVENTS = registry.counter("cache_bus_events_total", "Invalidation events received from other workers, by kind")
+CACHE_BUS_RECONNECTS = registry.counter("cache_bus_reconnects_total", "cache_bus listener reconnects (each one drops all cached stats)")
+
+
+def observe_pool(name: str, pool) -> None:
+    # gauges for a QueuePool; called from a collector at scrape time
+    DB_POOL_SIZE.set(pool.size(), engine=name)
+    DB_POOL_CHECKED_OUT.set(pool.checkedout(), engine=name)
+    DB_POOL_CHECKED_IN.set(pool.checkedin(), engine=name)
+    DB_POOL_OVERFLOW.set(pool.overflow(), engine=name)
+
+
+def observe_cache(name: str, cache) -> None:
+    # `cache` is a cache.TTLCache
+    CACHE_HITS.set_total(cache.hits, cache=name)
+    CACHE_MISSES.set_total(cache.misses, cache=name)
+    CACHE_EVICTIONS.set_total(cache.evictions, cache=name)
+    CACHE_SIZE.set(len(cache), cache=name)
+
+
+class MetricsMiddleware:
+    # Pure ASGI middleware so streamed bodies are included in the latency
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # label by route template, never the raw path, to keep cardinality bounded
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "<unmatched>"
+            method = scope.get("method", "")
+            HTTP_LATENCY.observe(time.perf_counter() - start, route=path, method=method)
+            HTTP_REQUESTS.inc(route=path, method=method, status=status["code"])
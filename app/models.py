@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, JSON, Text, Integer
+from sqlalchemy import Column, String, Date, DateTime, ForeignKey, JSON, Text, Integer, Index
 from sqlalchemy.dialects.postgresql import ARRAY, UUID
 from sqlalchemy.orm import declarative_base, relationship
 from datetime import datetime
@@ -30,7 +30,7 @@ class Deck(Base):
     id = Column(String, primary_key=True, default=generate_uuid)
     user_id = Column(String, ForeignKey("users.id"))
     name = Column(String, nullable=False)
-    format = Column(String)
+    format = Column(String, index=True)
     colors = Column(String)
     image_url = Column(String)
     raw_data = Column(JSON)
@@ -40,6 +40,12 @@ class Deck(Base):
     decklists = relationship("Decklist", back_populates="deck")
     matches = relationship("Match", primaryjoin="Deck.id == Match.deck_id", back_populates="deck")
 
+    __table_args__ = (
+        # keyset pagination on (created_at, id), per user and overall
+        Index("ix_decks_user_created", "user_id", "created_at", "id"),
+        Index("ix_decks_created", "created_at", "id"),
+    )
+
 
 class Decklist(Base):
     __tablename__ = "decklists"
@@ -49,11 +55,42 @@ class Decklist(Base):
     deck_id = Column(String, ForeignKey("decks.id"), nullable=False)
     mainboard = Column(JSON)
     sideboard = Column(JSON)
+    # crud.decklist_content_hash: deck id plus canonical boards; identical lists are stored once
+    content_hash = Column(String, unique=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     user = relationship("User", back_populates="decklists")
     deck = relationship("Deck", back_populates="decklists")
     matches = relationship("Match", primaryjoin="Decklist.id == Match.decklist_id", back_populates="decklist")
+    cards = relationship("DecklistCard", back_populates="decklist")
+
+
+class Card(Base):
+    __tablename__ = "cards"
+
+    # interned card names; decklist_cards references the small integer id
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String, nullable=False)
+    # crud.card_key(name): case- and whitespace-insensitive lookup key
+    name_key = Column(String, unique=True, index=True, nullable=False)
+
+
+class DecklistCard(Base):
+    __tablename__ = "decklist_cards"
+
+    # one row per (decklist, card, board), populated from Decklist.mainboard/sideboard
+    decklist_id = Column(String, ForeignKey("decklists.id"), primary_key=True)
+    card_id = Column(Integer, ForeignKey("cards.id"), primary_key=True)
+    board = Column(String, primary_key=True)  # "main" / "side"
+    quantity = Column(Integer, nullable=False)
+
+    decklist = relationship("Decklist", back_populates="cards")
+    card = relationship("Card")
+
+    __table_args__ = (
+        # card filters: decklists playing N+ copies of a card
+        Index("ix_decklist_cards_card_board_quantity", "card_id", "board", "quantity", "decklist_id"),
+    )
 
 
 class Player(Base):
@@ -68,6 +105,13 @@ class Player(Base):
     
     matches = relationship("Match", primaryjoin="Player.id == Match.player_id", back_populates="player")
 
+    __table_args__ = (
+        Index("ix_players_created", "created_at", "id"),
+        # username resolution: `usernames && ARRAY[...]`
+        Index("ix_players_mtgo_usernames", "mtgo_usernames", postgresql_using="gin"),
+        Index("ix_players_arena_usernames", "arena_usernames", postgresql_using="gin"),
+    )
+
 
 class Match(Base):
     __tablename__ = "matches"
@@ -94,3 +138,54 @@ class Match(Base):
     opponent_deck = relationship("Deck", back_populates="matches", foreign_keys=[opponent_deck_id])
     opponent_decklist = relationship("Decklist", back_populates="matches", foreign_keys=[opponent_decklist_id])
     opponent_player = relationship("Player", back_populates="matches", foreign_keys=[opponent_player_id])
+
+    __table_args__ = (
+        # matchup matrix: GROUP BY (deck_id, opponent_deck_id) within a time window
+        Index("ix_matches_deck_opponent_created", "deck_id", "opponent_deck_id", "created_at"),
+        # per-deck / per-player history in (created_at, id) order: keyset pages, time windows, export
+        Index("ix_matches_deck_created", "deck_id", "created_at", "id"),
+        Index("ix_matches_player_created", "player_id", "created_at", "id"),
+    )
+
+
+class DeckStatsRollup(Base):
+    __tablename__ = "deck_stats_rollup"
+
+    # running counters per deck, maintained by crud.create_match
+    deck_id = Column(String, ForeignKey("decks.id"), primary_key=True)
+    total_matches = Column(Integer, nullable=False, default=0)
+    total_games = Column(Integer, nullable=False, default=0)
+    match_wins = Column(Integer, nullable=False, default=0)
+    game_wins = Column(Integer, nullable=False, default=0)
+    play_wins = Column(Integer, nullable=False, default=0)
+    play_games = Column(Integer, nullable=False, default=0)
+    draw_wins = Column(Integer, nullable=False, default=0)
+    draw_games = Column(Integer, nullable=False, default=0)
+    neither_wins = Column(Integer, nullable=False, default=0)
+    neither_games = Column(Integer, nullable=False, default=0)
+    mulligan_sum = Column(Integer, nullable=False, default=0)
+    mulligan_count = Column(Integer, nullable=False, default=0)
+    mulligan_min = Column(Integer)
+    mulligan_max = Column(Integer)
+    # bumped by every counter update; with updated_at, the deck's ETag marker (crud.rollup_marker)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class DeckDailyStats(Base):
+    __tablename__ = "deck_daily_stats"
+
+    # per-deck counters for one UTC day of Match.created_at, maintained by crud.create_match;
+    # trend queries read a range of these instead of the matches
+    deck_id = Column(String, ForeignKey("decks.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    total_matches = Column(Integer, nullable=False, default=0)
+    total_games = Column(Integer, nullable=False, default=0)
+    match_wins = Column(Integer, nullable=False, default=0)
+    game_wins = Column(Integer, nullable=False, default=0)
+    play_wins = Column(Integer, nullable=False, default=0)
+    play_games = Column(Integer, nullable=False, default=0)
+    draw_wins = Column(Integer, nullable=False, default=0)
+    draw_games = Column(Integer, nullable=False, default=0)
+    neither_wins = Column(Integer, nullable=False, default=0)
+    neither_games = Column(Integer, nullable=False, default=0)
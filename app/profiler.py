@@ -0,0 +1,117 @@
+import contextvars
+import logging
+import os
+import re
+import time
+from collections import Counter
+from typing import Optional
+from sqlalchemy import event
+
+# Per-request query profiler (debug mode, DB_PROFILE=1).
+#
+# Engine events count every statement a request runs and its DB time; the totals are
+# returned as X-DB-* response headers. Statements slower than DB_PROFILE_SLOW_MS are
+# logged with their EXPLAIN plan, and a request is flagged when one statement shape
+# runs more than DB_PROFILE_REPEAT_THRESHOLD times (N+1 patterns such as a user lookup
+# per call or lazy relationship loads).
+
+DB_PROFILE = os.getenv("DB_PROFILE", "false").lower() in ("1", "true", "yes")
+DB_PROFILE_SLOW_MS = float(os.getenv("DB_PROFILE_SLOW_MS", "100"))
+DB_PROFILE_REPEAT_THRESHOLD = int(os.getenv("DB_PROFILE_REPEAT_THRESHOLD", "5"))
+# EXPLAIN ANALYZE runs the statement a second time; only SELECTs are ever explained
+DB_PROFILE_EXPLAIN_ANALYZE = os.getenv("DB_PROFILE_EXPLAIN_ANALYZE", "true").lower() in ("1", "true", "yes")
+
+logger = logging.getLogger("app.db.profile")
+
+_current: contextvars.ContextVar[Optional["QueryProfile"]] = contextvars.ContextVar("query_profile", default=None)
+
+# $1, $2 ... placeholder runs (IN lists, multi-row VALUES) collapse to one token
+_PLACEHOLDERS = re.compile(r"\$\d+(\s*,\s*\$\d+)*")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    return _WHITESPACE.sub(" ", _PLACEHOLDERS.sub("$n", statement)).strip()
+
+
+class QueryProfile:
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.shapes: Counter = Counter()
+
+    def repeated(self):
+        # statement shapes run more often than the threshold in this request
+        return [(shape, n) for shape, n in self.shapes.items() if n > DB_PROFILE_REPEAT_THRESHOLD]
+
+
+def _explain(conn, statement, parameters) -> str:
+    # a raw DBAPI cursor, so this statement doesn't re-enter the profiling events
+    options = "ANALYZE, BUFFERS" if DB_PROFILE_EXPLAIN_ANALYZE else "COSTS"
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute(f"EXPLAIN ({options}) {statement}", parameters)
+        return "\n".join(row[0] for row in cursor.fetchall())
+    finally:
+        cursor.close()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("profile_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["profile_start"].pop()
+    profile = _current.get()
+    if profile is not None:
+        profile.count += 1
+        profile.total_time += elapsed
+        profile.shapes[statement_shape(statement)] += 1
+    if elapsed * 1000 < DB_PROFILE_SLOW_MS:
+        return
+    plan = None
+    streaming = context is not None and context.execution_options.get("stream_results")
+    # only plain SELECTs are explained: they are safe to run again and hold no open cursor
+    if not executemany and not streaming and statement.lstrip()[:6].upper() == "SELECT":
+        try:
+            plan = _explain(conn, statement, parameters)
+        except Exception as e:  # the plan is best effort; never fail the request over it
+            plan = f"<explain failed: {e}>"
+    logger.warning("slow query %.1f ms: %s\nparameters: %r\n%s", elapsed * 1000, statement, parameters, plan or "")
+
+
+def install(engine) -> None:
+    # `engine` is an AsyncEngine; events live on its sync engine
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class ProfilerMiddleware:
+    # Pure ASGI middleware: one QueryProfile per request. Headers are attached when the
+    # response starts, so statements run while a body is streamed aren't included.
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        profile = QueryProfile()
+        token = _current.set(profile)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                repeated = profile.repeated()
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-query-count", str(profile.count).encode()))
+                headers.append((b"x-db-time-ms", f"{profile.total_time * 1000:.2f}".encode()))
+                if repeated:
+                    headers.append((b"x-db-repeated-statements", str(len(repeated)).encode()))
+                    for shape, n in repeated:
+                        logger.warning("possible N+1 in %s %s: %d executions of %s", scope.get("method"), scope.get("path"), n, shape)
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
@@ -1,7 +1,8 @@
 from pydantic import BaseModel, field_validator
 import re
 from typing import Optional, List, Dict, Any
-from datetime import datetime
+from datetime import date, datetime
+from .utils import naive_utc
 # --- User schemas ---
 class UserCreate(BaseModel):
     email: str
@@ -24,6 +25,15 @@ class TokenData(BaseModel):
     email: Optional[str] = None
 
 
+# authenticated user as seen by endpoints; cached per token, so it carries no ORM state
+class Principal(BaseModel):
+    id: str
+    email: str
+    username: str
+
+    model_config = {"from_attributes": True}
+
+
 # --- Deck schemas ---
 class DeckCreate(BaseModel):
     name: str
@@ -57,6 +67,11 @@ class DeckOut(BaseModel):
     model_config = {"from_attributes": True}
 
 
+class DeckPage(BaseModel):
+    items: List[DeckOut]
+    next_cursor: Optional[str] = None
+
+
 # --- Decklist schemas ---
 class DecklistCreate(BaseModel):
     deck_id: str
@@ -117,6 +132,17 @@ class PlayerOut(BaseModel):
     model_config = {"from_attributes": True}
 
 
+class PlayerPage(BaseModel):
+    items: List[PlayerOut]
+    next_cursor: Optional[str] = None
+
+
+# username -> player id, null when no player lists the name
+class PlayerLookup(BaseModel):
+    mtgo: Dict[str, Optional[str]] = {}
+    arena: Dict[str, Optional[str]] = {}
+
+
 # --- Match schemas ---
 class MatchCreate(BaseModel):
     deck_id: str
@@ -154,7 +180,29 @@ class MatchOut(BaseModel):
     model_config = {"from_attributes": True}
 
 
+class MatchPage(BaseModel):
+    items: List[MatchOut]
+    next_cursor: Optional[str] = None
+
+
+class BulkMatchError(BaseModel):
+    index: int  # position of the item in the submitted list / NDJSON line
+    detail: str
+
+
+class BulkMatchResult(BaseModel):
+    created_ids: List[str]
+    errors: List[BulkMatchError]
+
+
 # --- Stats schemas ---
+# [low, high] bounds; null without data
+class ConfidenceInterval(BaseModel):
+    confidence: float
+    wilson: Optional[List[float]] = None
+    bootstrap: Optional[List[float]] = None
+
+
 class DeckStats(BaseModel):
     total_matches: int
     total_games: int
@@ -162,7 +210,74 @@ class DeckStats(BaseModel):
     game_winrate: float
     by_play_draw: Dict[str, Optional[float]]
     mulligan_stats: Dict[str, Optional[float]]
+    # with ci=true: keyed "match_winrate" / "game_winrate"
+    confidence_intervals: Optional[Dict[str, ConfidenceInterval]] = None
+
+
+class DeckStatsBatchRequest(BaseModel):
+    deck_ids: List[str]
+    time_from: Optional[datetime] = None
+    time_to: Optional[datetime] = None
+
+    @field_validator('time_from', 'time_to')
+    @classmethod
+    def to_naive_utc(cls, v: Optional[datetime]) -> Optional[datetime]:
+        return naive_utc(v)
+
+
+class DeckStatsBatch(BaseModel):
+    # keyed by deck id, in request order
+    stats: Dict[str, DeckStats]
 
 
 class WinrateResponse(BaseModel):
     winrate: float
+    confidence_interval: Optional[ConfidenceInterval] = None
+
+
+# counters summed over the `window` buckets ending at `start`; rates are null without games
+class TrendPoint(BaseModel):
+    start: date
+    total_matches: int
+    match_wins: int
+    total_games: int
+    game_wins: int
+    match_winrate: Optional[float] = None
+    game_winrate: Optional[float] = None
+    by_play_draw: Dict[str, Optional[float]]
+
+
+class TrendResponse(BaseModel):
+    bucket: str
+    window: int
+    points: List[TrendPoint]
+
+
+# compact matrix: rows are decks, columns are opponent decks, both indexed by `deck_ids`;
+# cells with no matches are null
+class MatchupMatrix(BaseModel):
+    deck_ids: List[str]
+    deck_names: List[str]
+    matches: List[List[int]]
+    match_winrate: List[List[Optional[float]]]
+    game_winrate: List[List[Optional[float]]]
+
+
+class MetagameDeck(BaseModel):
+    deck_id: str
+    deck_name: str
+    matches: int
+    share: float  # of the format's matches in the window
+    match_wins: int
+    match_winrate: float
+    games: int
+    game_wins: int
+    game_winrate: Optional[float] = None
+
+
+class Metagame(BaseModel):
+    format: Optional[str] = None
+    time_from: Optional[datetime] = None
+    time_to: Optional[datetime] = None
+    total_matches: int
+    decks: List[MetagameDeck]
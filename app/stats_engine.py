@@ -0,0 +1,242 @@
+from itertools import chain
+from math import sqrt
+from statistics import NormalDist
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+
+# Vectorized stats over a batch of matches.
+#
+# The per-match arrays are loaded into zero-padded 2-D NumPy arrays (one row per
+# match) with a boolean mask of which cells hold real values, and every stat is
+# computed with array operations. Results are identical to crud.compute_deck_stats,
+# which stays as the reference implementation; `python -m bench.stats_engine --check-only`
+# compares the two on seeded random matches.
+
+# play/draw codes
+NEITHER, PLAY, DRAW = 0, 1, 2
+PLAY_DRAW_KEYS = {NEITHER: "neither", PLAY: "play", DRAW: "draw"}
+
+
+def _pd_code(v: Optional[str]) -> int:
+    # same classification as crud.compute_deck_stats
+    if not v:
+        return NEITHER
+    c = v[0].lower()
+    if c == "p":
+        return PLAY
+    if c == "d":
+        return DRAW
+    return NEITHER
+
+
+def _padded(lists: Sequence[Optional[Sequence]], dtype, width: Optional[int] = None, convert=None):
+    # (values, mask, lengths) for a ragged list of lists; None counts as empty
+    lists = [l or () for l in lists]
+    lens = np.fromiter((len(l) for l in lists), dtype=np.int64, count=len(lists))
+    width = max(int(lens.max()) if len(lens) else 0, width or 0)
+    mask = np.arange(width) < lens[:, None]
+    values = np.zeros((len(lists), width), dtype=dtype)
+    flat = chain.from_iterable(lists)
+    if convert is not None:
+        flat = map(convert, flat)
+    values[mask] = np.fromiter(flat, dtype=dtype, count=int(lens.sum()))
+    return values, mask, lens
+
+
+class MatchArrays:
+    def __init__(self, game_win_arrays, mulligan_arrays, opponent_mulligan_arrays, play_draw_arrays):
+        self.games, self.games_mask, self.game_counts = _padded(game_win_arrays, np.int64)
+        self.mulls, self.mulls_mask, self.mull_counts = _padded(mulligan_arrays, np.int64)
+        self.opp_mulls, self.opp_mulls_mask, self.opp_mull_counts = _padded(opponent_mulligan_arrays, np.int64)
+        # padded at least as wide as the game arrays; games without an entry count as "neither"
+        self.play_draw, self.play_draw_mask, self.play_draw_counts = _padded(
+            play_draw_arrays, np.int8, width=self.games.shape[1], convert=_pd_code
+        )
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Any]) -> "MatchArrays":
+        # rows / Match objects with game_win_array, mulligan_array, opponent_mulligan_array, play_draw_array
+        rows = list(rows)
+        return cls(
+            [r.game_win_array for r in rows],
+            [r.mulligan_array for r in rows],
+            [r.opponent_mulligan_array for r in rows],
+            [r.play_draw_array for r in rows],
+        )
+
+    def __len__(self) -> int:
+        return self.games.shape[0]
+
+    def game_wins_per_match(self) -> np.ndarray:
+        return self.games.sum(axis=1)  # padding is zero
+
+    def match_won(self) -> np.ndarray:
+        # a match is won with 2+ game wins (best of 3)
+        return (self.game_counts > 0) & (self.game_wins_per_match() >= 2)
+
+
+def deck_counters(arrays: MatchArrays) -> Dict[str, Any]:
+    # the same counters as models.DeckStatsRollup
+    g = arrays.games
+    played = arrays.games_mask
+    won = played & (g == 1)
+    pd = arrays.play_draw[:, : g.shape[1]]
+    counters: Dict[str, Any] = {
+        "total_matches": len(arrays),
+        "total_games": int(arrays.game_counts.sum()),
+        "match_wins": int(arrays.match_won().sum()),
+        "game_wins": int(g.sum()),
+    }
+    for code, key in PLAY_DRAW_KEYS.items():
+        in_bucket = pd == code
+        counters[f"{key}_games"] = int((played & in_bucket).sum())
+        counters[f"{key}_wins"] = int((won & in_bucket).sum())
+    mulls = arrays.mulls[arrays.mulls_mask]
+    counters["mulligan_sum"] = int(mulls.sum())
+    counters["mulligan_count"] = int(mulls.size)
+    counters["mulligan_min"] = int(mulls.min()) if mulls.size else None
+    counters["mulligan_max"] = int(mulls.max()) if mulls.size else None
+    return counters
+
+
+def _mulligan_lte(values: np.ndarray, mask: np.ndarray, threshold: int) -> np.ndarray:
+    # no game above the threshold; matches without mulligan data are kept
+    return ~((values > threshold) & mask).any(axis=1)
+
+
+def winrate_mask(
+    arrays: MatchArrays,
+    player_mulligan_lte: Optional[int] = None,
+    opponent_mulligan_lte: Optional[int] = None,
+    play_draw: Optional[str] = None,
+) -> np.ndarray:
+    # same semantics as crud.winrate_filters
+    keep = np.ones(len(arrays), dtype=bool)
+    if player_mulligan_lte is not None:
+        keep &= _mulligan_lte(arrays.mulls, arrays.mulls_mask, player_mulligan_lte)
+    if opponent_mulligan_lte is not None:
+        keep &= _mulligan_lte(arrays.opp_mulls, arrays.opp_mulls_mask, opponent_mulligan_lte)
+    if play_draw:
+        pd = np.where(arrays.play_draw_mask, arrays.play_draw, -1)
+        no_pd_data = arrays.play_draw_counts == 0
+        wanted = play_draw.lower()
+        if wanted.startswith("p"):
+            keep &= no_pd_data | (pd == PLAY).any(axis=1)
+        elif wanted.startswith("d"):
+            keep &= no_pd_data | (pd == DRAW).any(axis=1)
+        else:
+            keep &= ~((pd == PLAY) | (pd == DRAW)).any(axis=1)
+    return keep
+
+
+def winrate(arrays: MatchArrays, game: Optional[int] = None, **filters) -> Dict[str, Any]:
+    keep = winrate_mask(arrays, **filters)
+    if game is None:
+        wins = int((arrays.match_won() & keep).sum())
+        total = int(keep.sum())
+    else:
+        # game-specific winrate: game param is 1-based
+        played = keep & (arrays.game_counts >= game)
+        total = int(played.sum())
+        wins = int(arrays.games[played, game - 1].sum()) if total else 0
+    return {"wins": wins, "total": total, "winrate": (wins / total) if total > 0 else 0.0}
+
+
+# --- confidence intervals ---
+DEFAULT_RESAMPLES = 10_000
+DEFAULT_SEED = 0
+
+# (successes, trials) of one match -> number of matches with that outcome,
+# e.g. {(2, 3): 40, (1, 3): 25, (2, 2): 30, (0, 2): 20} for game wins / games played
+Patterns = Dict[Tuple[int, int], int]
+Interval = Optional[Tuple[float, float]]
+
+
+def wilson_interval(wins: int, total: int, confidence: float = 0.95) -> Interval:
+    if total <= 0:
+        return None
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    p = wins / total
+    z2n = z * z / total
+    center = (p + z2n / 2) / (1 + z2n)
+    half = z * sqrt(p * (1 - p) / total + z2n / (4 * total)) / (1 + z2n)
+    return max(0.0, center - half), min(1.0, center + half)
+
+
+def binary_patterns(wins: int, total: int) -> Patterns:
+    # one success or failure per match: match winrate, or the winrate of one game
+    return {(1, 1): wins, (0, 1): total - wins}
+
+
+def game_patterns(arrays: MatchArrays) -> Patterns:
+    pairs = np.stack([arrays.game_wins_per_match(), arrays.game_counts], axis=1)
+    if not len(pairs):
+        return {}
+    values, counts = np.unique(pairs, axis=0, return_counts=True)
+    return {(int(w), int(g)): int(c) for (w, g), c in zip(values, counts)}
+
+
+def match_patterns(games: Patterns) -> Patterns:
+    # match wins from game patterns: won with 2+ game wins
+    wins = sum(c for (w, g), c in games.items() if g > 0 and w >= 2)
+    return binary_patterns(wins, sum(games.values()))
+
+
+def bootstrap_intervals(
+    pattern_sets: Sequence[Patterns],
+    confidence: float = 0.95,
+    resamples: int = DEFAULT_RESAMPLES,
+    seed: int = DEFAULT_SEED,
+) -> List[Interval]:
+    # Percentile bootstrap of sum(successes) / sum(trials) over matches, for many decks in
+    # one call. A resample of n matches only matters through how often each distinct
+    # (successes, trials) pattern is drawn, so all resamples of a deck are one vectorized
+    # multinomial draw over its few patterns rather than n random indices each: the cost
+    # doesn't grow with n. With one trial per match it reduces to a binomial draw. Patterns
+    # are drawn in sorted order, so equal inputs give equal intervals for a given seed.
+    rng = np.random.default_rng(seed)
+    alpha = (1 - confidence) / 2
+    out: List[Interval] = []
+    for patterns in pattern_sets:
+        keys = sorted(k for k, c in patterns.items() if c > 0)
+        if not any(t for _, t in keys):
+            out.append(None)
+            continue
+        counts = np.array([patterns[k] for k in keys], dtype=np.int64)
+        n = int(counts.sum())
+        if all(t == 1 for _, t in keys):
+            ratio = rng.binomial(n, patterns.get((1, 1), 0) / n, size=resamples) / n
+        else:
+            draws = rng.multinomial(n, counts / n, size=resamples)
+            s = draws @ np.array([k[0] for k in keys], dtype=np.float64)
+            t = draws @ np.array([k[1] for k in keys], dtype=np.float64)
+            ratio = np.divide(s, t, out=np.full_like(s, np.nan), where=t > 0)
+        lo, hi = np.nanquantile(ratio, [alpha, 1 - alpha])
+        out.append((float(lo), float(hi)))
+    return out
+
+
+def deck_intervals(
+    games: Patterns,
+    confidence: float = 0.95,
+    resamples: int = DEFAULT_RESAMPLES,
+    seed: int = DEFAULT_SEED,
+) -> Dict[str, Dict[str, Any]]:
+    # Wilson and bootstrap intervals for a deck's match and game winrates. The game
+    # bootstrap resamples whole matches, so games of one match stay together.
+    matches = match_patterns(games)
+    boot_match, boot_game = bootstrap_intervals([matches, games], confidence, resamples, seed)
+    game_wins = sum(w * c for (w, g), c in games.items())
+    total_games = sum(g * c for (w, g), c in games.items())
+    return {
+        "match_winrate": {
+            "confidence": confidence,
+            "wilson": wilson_interval(matches[(1, 1)], sum(matches.values()), confidence),
+            "bootstrap": boot_match,
+        },
+        "game_winrate": {
+            "confidence": confidence,
+            "wilson": wilson_interval(game_wins, total_games, confidence),
+            "bootstrap": boot_game,
+        },
+    }
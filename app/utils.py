@@ -1,9 +1,47 @@
-from datetime import datetime
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+import base64
+import hashlib
+import json
 from dateutil import parser
 
+def naive_utc(dt: Optional[datetime]) -> Optional[datetime]:
+    # created_at columns are naive UTC; asyncpg refuses to compare them with aware datetimes
+    if dt is not None and dt.tzinfo is not None:
+        return dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
 def parse_iso_or_none(s: str):
+    # naive UTC; raises ValueError on anything that isn't ISO 8601
     if not s:
         return None
     if isinstance(s, datetime):
-        return s
-    return parser.isoparse(s)
+        return naive_utc(s)
+    return naive_utc(parser.isoparse(s))
+
+# Opaque keyset cursors: base64url of [created_at, id] of the last row on a page
+def encode_cursor(created_at: datetime, id: str) -> str:
+    raw = json.dumps([created_at.isoformat(), id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, str]]:
+    # raises ValueError on anything that isn't a cursor we issued
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, id = json.loads(raw)
+        return datetime.fromisoformat(created_at), str(id)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+# Conditional GET: strong ETags over a change marker and the request's normalized parameters
+def make_etag(*parts) -> str:
+    return '"' + hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()[:20] + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # If-None-Match is "*" or a list of tags, compared weakly
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or any(t[2:] == etag if t.startswith("W/") else t == etag for t in tags)
@@ -0,0 +1 @@
+# Benchmarks and equivalence checks. Run modules with `python -m bench.<name>`.
@@ -0,0 +1,134 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from typing import Any, Dict, List
+
+import httpx
+
+from bench.common import summarize
+
+# Cross-worker cache invalidation check: starts two API workers (separate uvicorn
+# processes) on the same PostgreSQL, writes through one and measures how long the
+# other keeps serving what it cached before the write. Stats cache TTLs are raised
+# so only invalidation can refresh an entry.
+#   python -m bench.cache_bus --rounds 50
+#   python -m bench.cache_bus --rounds 5 --no-bus   # without CACHE_BUS: stays stale
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_worker(port: int, bus: bool) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "CACHE_BUS": "1" if bus else "0",
+        "STATS_CACHE_TTL": "3600",
+        "PLAYER_NAME_CACHE_TTL": "3600",
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if (await client.get("/")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"worker at {client.base_url} didn't start")
+        await asyncio.sleep(0.1)
+
+
+async def until(check, timeout: float):
+    # seconds until `check()` is true, or None after `timeout`
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if await check():
+            return time.perf_counter() - start
+        await asyncio.sleep(0.002)
+    return None
+
+
+async def run(rounds: int, bus: bool, timeout: float) -> Dict[str, Any]:
+    ports = [_free_port(), _free_port()]
+    workers = [start_worker(p, bus) for p in ports]
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{ports[0]}") as a, httpx.AsyncClient(base_url=f"http://127.0.0.1:{ports[1]}") as b:
+            await wait_ready(a)
+            await wait_ready(b)
+            run_id = uuid.uuid4().hex[:8]
+            email = f"bus-{run_id}@bench"
+            await a.post("/register", json={"email": email, "username": f"bus-{run_id}", "password": "pw"})
+            token = (await a.post("/token", data={"username": email, "password": "pw"})).json()["access_token"]
+            headers = {"Authorization": f"Bearer {token}"}
+            deck_id = (await a.post("/deck", json={"name": f"Bus {run_id}", "format": "Modern"}, headers=headers)).json()["id"]
+
+            stats_lag: List[float] = []
+            player_lag: List[float] = []
+            stale = {"stats": 0, "players": 0}
+            for i in range(rounds):
+                # worker B caches the deck's stats, worker A records a match
+                before = (await b.get(f"/deck/{deck_id}/stats")).json()["total_matches"]
+                await a.post("/match", json={"deck_id": deck_id, "game_win_array": [1, 0, 1]}, headers=headers)
+
+                async def stats_updated():
+                    return (await b.get(f"/deck/{deck_id}/stats")).json()["total_matches"] > before
+
+                lag = await until(stats_updated, timeout)
+                if lag is None:
+                    stale["stats"] += 1
+                else:
+                    stats_lag.append(lag)
+
+                # worker B caches an unknown username, worker A creates the player
+                name = f"bus_{run_id}_{i}"
+                await b.get("/player/lookup", params={"mtgo": name})
+                await a.post("/player", json={"name": name, "mtgo_usernames": [name]})
+
+                async def player_resolved():
+                    return (await b.get("/player/lookup", params={"mtgo": name})).json()["mtgo"][name] is not None
+
+                lag = await until(player_resolved, timeout)
+                if lag is None:
+                    stale["players"] += 1
+                else:
+                    player_lag.append(lag)
+            return {
+                "cache_bus": bus,
+                "rounds": rounds,
+                "still_stale_after_timeout": stale,
+                "stats_propagation": summarize(stats_lag, sum(stats_lag) or 1),
+                "player_propagation": summarize(player_lag, sum(player_lag) or 1),
+            }
+    finally:
+        for w in workers:
+            w.terminate()
+        for w in workers:
+            w.wait(timeout=10)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.cache_bus")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=2.0, help="seconds to wait for worker B to see a write")
+    parser.add_argument("--no-bus", action="store_true", help="run the workers without CACHE_BUS")
+    args = parser.parse_args(argv)
+    print(json.dumps(asyncio.run(run(args.rounds, not args.no_bus, args.timeout)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import contextlib
+import statistics
+from typing import Dict, List
+
+import httpx
+
+# Shared helpers: an in-process ASGI client and latency summaries.
+# Benchmarks that touch the API need DATABASE_URL pointing at a local PostgreSQL.
+
+
+async def create_schema():
+    from app.database import engine
+    from app import models
+
+    async with engine.begin() as conn:
+        await conn.run_sync(models.Base.metadata.create_all)
+
+
+@contextlib.asynccontextmanager
+async def app_client():
+    # httpx's ASGI transport doesn't run startup events, so create the tables here
+    from app.main import app
+    from app.database import engine
+
+    await create_schema()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        yield client
+    await engine.dispose()
+
+
+def summarize(latencies: List[float], elapsed: float) -> Dict[str, float]:
+    # latencies in seconds -> throughput and p50/p95/p99 in milliseconds
+    if not latencies:
+        return {"count": 0}
+    ordered = sorted(latencies)
+
+    def pct(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000
+
+    return {
+        "count": len(ordered),
+        "throughput_rps": len(ordered) / elapsed if elapsed > 0 else None,
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": pct(50),
+        "p95_ms": pct(95),
+        "p99_ms": pct(99),
+        "max_ms": ordered[-1] * 1000,
+    }
@@ -0,0 +1,160 @@
+import argparse
+import asyncio
+import datetime
+import json
+import random
+import uuid
+from typing import Any, Dict, List
+
+from bench.common import create_schema
+
+# Seeded synthetic data: users, decks, decklists, players and matches with realistic
+# per-game arrays, written with batched Core inserts (1k to 1M+ matches).
+#   python -m bench.generate --matches 100000 --decks 200 --seed 1
+
+FORMATS = ["Modern", "Legacy", "Pioneer", "Standard", "Pauper"]
+COLORS = ["UR", "BG", "W", "R", "UW", "WUB", "BRg", "G", "UB", "RG"]
+CARD_POOL = [f"Card {i}" for i in range(400)]
+BENCH_PASSWORD = "bench-password"
+
+
+def _mulligans(rng: random.Random) -> int:
+    # roughly 80% keep 7, 17% one mulligan, 3% two or more
+    r = rng.random()
+    return 0 if r < 0.80 else 1 if r < 0.97 else 2 + (r > 0.995)
+
+
+def synthetic_match(rng: random.Random, edge: float) -> Dict[str, Any]:
+    # best of three; `edge` is the deck's game win probability in this pairing.
+    # G1 play/draw is a coin flip, afterwards the loser of the previous game is on the play.
+    games, play_draw = [], []
+    on_play = rng.random() < 0.5
+    while len(games) < 3 and games.count(1) < 2 and games.count(0) < 2:
+        p = edge + (0.05 if on_play else -0.05)
+        won = 1 if rng.random() < p else 0
+        games.append(won)
+        play_draw.append("play" if on_play else "draw")
+        on_play = not won
+    return {
+        "game_win_array": games,
+        "mulligan_array": [_mulligans(rng) for _ in games],
+        "opponent_mulligan_array": [_mulligans(rng) for _ in games] if rng.random() < 0.7 else None,
+        "play_draw_array": play_draw if rng.random() < 0.95 else None,
+    }
+
+
+def _decklist_text(rng: random.Random) -> List[Dict[str, Any]]:
+    cards = rng.sample(CARD_POOL, 17)
+    return [{"name": c, "quantity": q} for c, q in zip(cards, [4] * 13 + [3, 2, 2, 1])]
+
+
+async def generate(matches: int, decks: int, players: int, users: int, seed: int, days: int, batch_size: int = 10000) -> Dict[str, Any]:
+    from app.database import AsyncSessionLocal
+    from app import auth, crud, models
+
+    rng = random.Random(seed)
+    now = datetime.datetime.utcnow()
+    start = now - datetime.timedelta(days=days)
+    # ids and names are unique per run so several runs can share a database;
+    # they don't draw from `rng`, so the data itself depends only on the seed
+    run = uuid.uuid4().hex[:8]
+
+    def uid() -> str:
+        return str(uuid.uuid4())
+
+    def when() -> datetime.datetime:
+        return start + datetime.timedelta(seconds=rng.random() * days * 86400)
+
+    await create_schema()
+    hashed = auth.get_password_hash(BENCH_PASSWORD)
+    user_rows = [{"id": uid(), "email": f"bench-{run}-{i}@bench", "username": f"bench-{run}-{i}", "hashed_password": hashed, "created_at": when()} for i in range(users)]
+    deck_rows = [{
+        "id": uid(), "user_id": rng.choice(user_rows)["id"], "name": f"Deck {i}", "format": rng.choice(FORMATS),
+        "colors": rng.choice(COLORS), "created_at": when(),
+    } for i in range(decks)]
+    decklist_rows = [{
+        "id": uid(), "user_id": d["user_id"], "deck_id": d["id"], "mainboard": _decklist_text(rng),
+        "sideboard": _decklist_text(rng)[:5], "created_at": when(),
+    } for d in deck_rows for _ in range(2)]
+    lists_by_deck: Dict[str, List[str]] = {}
+    for dl in decklist_rows:
+        dl["content_hash"] = crud.decklist_content_hash(dl["deck_id"], dl["mainboard"], dl["sideboard"])
+        lists_by_deck.setdefault(dl["deck_id"], []).append(dl["id"])
+    player_rows = [{
+        "id": uid(), "name": f"Player {i}", "mtgo_usernames": [f"mtgo_{run}_{i}"], "arena_usernames": [f"arena_{run}_{i}#{i:05d}"],
+        "created_at": when(),
+    } for i in range(players)]
+    strength = {d["id"]: rng.gauss(0.5, 0.06) for d in deck_rows}
+    by_format: Dict[str, List[str]] = {}
+    for d in deck_rows:
+        by_format.setdefault(d["format"], []).append(d["id"])
+    deck_format = {d["id"]: d["format"] for d in deck_rows}
+
+    async with AsyncSessionLocal() as db:
+        for table, rows in ((models.User, user_rows), (models.Deck, deck_rows), (models.Decklist, decklist_rows), (models.Player, player_rows)):
+            for i in range(0, len(rows), batch_size):
+                await db.execute(table.__table__.insert(), rows[i:i + batch_size])
+        await crud.index_decklist_cards(db, [(d["id"], d["mainboard"], d["sideboard"]) for d in decklist_rows])
+        await db.commit()
+
+        # a few popular decks account for most matches
+        deck_ids = [d["id"] for d in deck_rows]
+        weights = [1.0 / (rank + 1) ** 0.8 for rank in range(len(deck_ids))]
+        written = 0
+        while written < matches:
+            batch = []
+            for deck_id in rng.choices(deck_ids, weights=weights, k=min(batch_size, matches - written)):
+                opp = rng.choice(by_format[deck_format[deck_id]])
+                edge = min(0.9, max(0.1, 0.5 + strength[deck_id] - strength[opp]))
+                player, opponent = rng.sample(player_rows, 2) if len(player_rows) > 1 else (None, None)
+                batch.append({
+                    "id": uid(),
+                    "deck_id": deck_id,
+                    "decklist_id": rng.choice(lists_by_deck[deck_id]),
+                    "player_id": player["id"] if player else None,
+                    "opponent_name": opponent["mtgo_usernames"][0] if opponent else None,
+                    "opponent_deck_id": opp,
+                    "opponent_decklist_id": rng.choice(lists_by_deck[opp]),
+                    "opponent_player_id": opponent["id"] if opponent else None,
+                    "created_at": when(),
+                    **synthetic_match(rng, edge),
+                })
+            await db.execute(models.Match.__table__.insert(), batch)
+            await db.commit()
+            written += len(batch)
+        # derived tables are rebuilt from matches, as after any backfill
+        await crud.rebuild_deck_stats_rollup(db)
+
+    return {
+        "seed": seed,
+        "matches": matches,
+        "decks": deck_ids,
+        "players": [p["id"] for p in player_rows],
+        "users": [u["email"] for u in user_rows],
+        "password": BENCH_PASSWORD,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.generate")
+    parser.add_argument("--matches", type=int, default=10_000)
+    parser.add_argument("--decks", type=int, default=50)
+    parser.add_argument("--players", type=int, default=200)
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--days", type=int, default=365, help="spread created_at over this many past days")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    async def run():
+        from app.database import engine
+        try:
+            return await generate(args.matches, args.decks, args.players, args.users, args.seed, args.days)
+        finally:
+            await engine.dispose()
+
+    summary = asyncio.run(run())
+    print(json.dumps({k: (v if not isinstance(v, list) else len(v)) for k, v in summary.items()}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
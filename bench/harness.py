@@ -0,0 +1,134 @@
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import os
+import random
+import subprocess
+import time
+from typing import Any, Callable, Dict, List
+from urllib.parse import urlencode
+
+# Load harness: seeds a local PostgreSQL with bench.generate, then drives the API
+# in-process (ASGI, no network) and reports throughput and p50/p95/p99 per scenario
+# as JSON, for comparing runs across commits.
+#   python -m bench.harness --matches 100000 --requests 300 --concurrency 20 --out run.json
+# --no-cache disables the stats cache so every read hits the database.
+
+WINRATE_FILTERS = {
+    "game": [None, 1, 2, 3],
+    "play_draw": [None, "play", "draw", "neither"],
+    "player_mulligan_lte": [None, 0, 1],
+    "opponent_mulligan_lte": [None, 0],
+}
+
+
+def winrate_queries(time_window: bool) -> List[str]:
+    # one query string per combination of the winrate filters
+    queries = []
+    keys = list(WINRATE_FILTERS)
+    for values in itertools.product(*(WINRATE_FILTERS[k] for k in keys)):
+        params = {k: v for k, v in zip(keys, values) if v is not None}
+        if time_window:
+            params["time_from"] = (datetime.datetime.utcnow() - datetime.timedelta(days=90)).isoformat()
+        queries.append(urlencode(params))
+    return queries
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def drive(requests: int, concurrency: int, call: Callable[[int], Any]) -> Dict[str, Any]:
+    from bench.common import summarize
+
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with sem:
+            start = time.perf_counter()
+            r = await call(i)
+            latencies.append(time.perf_counter() - start)
+            statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return {**summarize(latencies, time.perf_counter() - start), "statuses": statuses}
+
+
+async def run(args) -> Dict[str, Any]:
+    from bench.common import app_client
+    from bench.generate import generate, synthetic_match
+
+    data = await generate(args.matches, args.decks, args.players, args.users, args.seed, args.days)
+    rng = random.Random(args.seed)
+    decks = data["decks"]
+    # the hottest decks, as generated, carry most matches
+    hot = decks[: max(1, len(decks) // 10)]
+    report: Dict[str, Any] = {
+        "commit": git_commit(),
+        "started_at": datetime.datetime.utcnow().isoformat(),
+        "params": vars(args),
+        "scenarios": {},
+    }
+    scenarios = report["scenarios"]
+
+    async with app_client() as client:
+        scenarios["GET /deck/{id}/stats"] = await drive(args.requests, args.concurrency, lambda i: client.get(f"/deck/{rng.choice(hot)}/stats"))
+
+        for q in winrate_queries(args.time_window):
+            scenarios[f"GET /deck/{{id}}/winrate?{q}"] = await drive(
+                args.requests, args.concurrency, lambda i, q=q: client.get(f"/deck/{rng.choice(hot)}/winrate?{q}")
+            )
+
+        def new_match(i):
+            deck_id = rng.choice(decks)
+            body = {"deck_id": deck_id, "opponent_deck_id": rng.choice(decks), **synthetic_match(rng, 0.5)}
+            return client.post("/match", json=body)
+
+        scenarios["POST /match"] = await drive(args.requests, args.concurrency, new_match)
+
+        # bcrypt-bound: fewer requests so a run stays short
+        logins = max(1, args.requests // 10)
+        scenarios["POST /token"] = await drive(
+            logins, args.concurrency, lambda i: client.post("/token", data={"username": rng.choice(data["users"]), "password": data["password"]})
+        )
+
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.harness")
+    parser.add_argument("--matches", type=int, default=10_000)
+    parser.add_argument("--decks", type=int, default=50)
+    parser.add_argument("--players", type=int, default=200)
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--time-window", action="store_true", help="add a 90-day time_from to the winrate queries")
+    parser.add_argument("--no-cache", action="store_true", help="disable the in-process stats cache")
+    parser.add_argument("--out", default=None, help="write the JSON report here as well as to stdout")
+    args = parser.parse_args(argv)
+
+    if args.no_cache:
+        # must happen before app modules are imported
+        os.environ["STATS_CACHE_TTL"] = "0"
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
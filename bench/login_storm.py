@@ -0,0 +1,70 @@
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+from app import auth
+from bench.common import app_client, summarize
+
+# Latency of an unrelated endpoint (GET /) while many clients log in at once.
+# Compare bcrypt on the event loop with the thread pool:
+#   PASSWORD_HASH_WORKERS=0 python -m bench.login_storm
+#   python -m bench.login_storm
+
+
+async def run(logins: int, concurrency: int, probe_interval: float):
+    async with app_client() as client:
+        name = f"storm-{uuid.uuid4().hex[:8]}"
+        r = await client.post("/register", json={"email": f"{name}@bench", "username": name, "password": "pw"})
+        r.raise_for_status()
+
+        login_latencies, probe_latencies, statuses = [], [], {}
+        done = asyncio.Event()
+        sem = asyncio.Semaphore(concurrency)
+
+        async def login():
+            async with sem:
+                start = time.perf_counter()
+                r = await client.post("/token", data={"username": name, "password": "pw"})
+                login_latencies.append(time.perf_counter() - start)
+                statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+
+        async def probe():
+            # latency is measured from when the probe was due, so event-loop stalls
+            # that delay sending it are counted (no coordinated omission)
+            due = time.perf_counter()
+            while not done.is_set():
+                await asyncio.sleep(max(0.0, due - time.perf_counter()))
+                await client.get("/")
+                probe_latencies.append(time.perf_counter() - due)
+                due += probe_interval
+
+        prober = asyncio.create_task(probe())
+        start = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(logins)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await prober
+
+    return {
+        "password_hash_workers": auth.PASSWORD_HASH_WORKERS,
+        "logins": logins,
+        "concurrency": concurrency,
+        "login_statuses": statuses,
+        "login": summarize(login_latencies, elapsed),
+        "unrelated_endpoint": summarize(probe_latencies, elapsed),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.login_storm")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--probe-interval", type=float, default=0.005, help="seconds between GET / probes")
+    args = parser.parse_args(argv)
+    print(json.dumps(asyncio.run(run(args.logins, args.concurrency, args.probe_interval)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
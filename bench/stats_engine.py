@@ -0,0 +1,141 @@
+import argparse
+import json
+import random
+import time
+from types import SimpleNamespace
+from typing import Optional
+
+from app import crud, stats_engine
+
+# Equivalence check and timing of the NumPy stats engine against the reference
+# implementations. Needs no database:
+#   python -m bench.stats_engine --matches 100000
+#   python -m bench.stats_engine --check-only --matches 2000 --seeds 20   # exits 1 on a difference
+
+PLAY_DRAW_VALUES = ["play", "draw", "Play", "DRAW", "neither", "", None]
+
+
+def synthetic_matches(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    matches = []
+    for _ in range(n):
+        games = rng.choice([1, 2, 2, 3, 3, 3])
+        matches.append(SimpleNamespace(
+            game_win_array=[rng.randint(0, 1) for _ in range(games)],
+            mulligan_array=rng.choice([None, [], [rng.choice([0, 0, 0, 1, 1, 2]) for _ in range(games)]]),
+            opponent_mulligan_array=rng.choice([None, [rng.choice([0, 0, 1, 2]) for _ in range(games)]]),
+            # play/draw arrays may be shorter or longer than the game array
+            play_draw_array=rng.choice([None, [], [rng.choice(PLAY_DRAW_VALUES) for _ in range(rng.randint(1, 3))]]),
+        ))
+    return matches
+
+
+def reference_winrate(matches, game: Optional[int] = None, player_mulligan_lte=None, opponent_mulligan_lte=None, play_draw=None):
+    # the original per-match loop of GET /deck/{deck_id}/winrate, plus the opponent filter
+    filtered = []
+    for m in matches:
+        if player_mulligan_lte is not None and m.mulligan_array:
+            if any(int(x) > player_mulligan_lte for x in m.mulligan_array):
+                continue
+        if opponent_mulligan_lte is not None and m.opponent_mulligan_array:
+            if any(int(x) > opponent_mulligan_lte for x in m.opponent_mulligan_array):
+                continue
+        if play_draw and m.play_draw_array:
+            normalized = [(p.lower()[0] if p else "n") for p in m.play_draw_array]
+            if play_draw.lower().startswith("p"):
+                if not any(p == "p" for p in normalized):
+                    continue
+            elif play_draw.lower().startswith("d"):
+                if not any(p == "d" for p in normalized):
+                    continue
+            elif any(p in ("p", "d") for p in normalized):
+                continue
+        filtered.append(m)
+    if game is None:
+        wins = sum(1 for m in filtered if sum(int(g) for g in (m.game_win_array or [])) >= 2)
+        total = len(filtered)
+    else:
+        idx = game - 1
+        played = [m for m in filtered if idx < len(m.game_win_array or [])]
+        wins = sum(int(m.game_win_array[idx]) for m in played)
+        total = len(played)
+    return (wins / total) if total > 0 else 0.0
+
+
+def filter_combinations():
+    for game in (None, 1, 2, 3):
+        for pml in (None, 0, 1):
+            for oml in (None, 0):
+                for pd in (None, "play", "draw", "neither"):
+                    yield dict(game=game, player_mulligan_lte=pml, opponent_mulligan_lte=oml, play_draw=pd)
+
+
+def timed(fn, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+class NotEquivalent(Exception):
+    pass
+
+
+def check_equivalence(matches, sizes) -> None:
+    # raises NotEquivalent on the first difference; explicit checks, so `python -O` can't skip them
+    for n in sizes:
+        sample = matches[:n]
+        arrays = stats_engine.MatchArrays.from_rows(sample)
+        if crud.compute_deck_stats_np(arrays) != crud.compute_deck_stats(sample):
+            raise NotEquivalent(f"stats differ at n={n}")
+        if crud.compute_deck_stats_np(arrays, confidence=0.95) != crud.compute_deck_stats(sample, confidence=0.95):
+            raise NotEquivalent(f"intervals differ at n={n}")
+        for combo in filter_combinations():
+            want = reference_winrate(sample, **combo)
+            got = stats_engine.winrate(arrays, **combo)["winrate"]
+            if got != want:
+                raise NotEquivalent(f"winrate differs at n={n} for {combo}: {got} != {want}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.stats_engine")
+    parser.add_argument("--matches", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seeds", type=int, default=1, help="check equivalence on this many seeds from --seed")
+    parser.add_argument("--check-only", action="store_true", help="equivalence only, no timings; exits 1 on a difference")
+    args = parser.parse_args(argv)
+
+    # equivalence, on a few sizes including the empty deck
+    try:
+        for seed in range(args.seed, args.seed + args.seeds):
+            check_equivalence(synthetic_matches(args.matches, seed), (0, 1, 17, args.matches))
+    except NotEquivalent as e:
+        raise SystemExit(f"NumPy engine differs from the reference: {e}")
+    if args.check_only:
+        print(json.dumps({"matches": args.matches, "seeds": args.seeds, "equivalent": True}))
+        return
+
+    matches = synthetic_matches(args.matches, args.seed)
+    arrays = stats_engine.MatchArrays.from_rows(matches)
+    games = stats_engine.game_patterns(arrays)
+    decks = 50
+    report = {
+        "matches": args.matches,
+        "equivalent": True,
+        "compute_deck_stats_s": timed(lambda: crud.compute_deck_stats(matches), args.repeat),
+        "compute_deck_stats_np_s": timed(lambda: crud.compute_deck_stats_np(matches), args.repeat),
+        "compute_deck_stats_np_preloaded_s": timed(lambda: crud.compute_deck_stats_np(arrays), args.repeat),
+        "winrate_reference_s": timed(lambda: reference_winrate(matches, game=2, player_mulligan_lte=1, play_draw="play"), args.repeat),
+        "winrate_np_preloaded_s": timed(lambda: stats_engine.winrate(arrays, game=2, player_mulligan_lte=1, play_draw="play"), args.repeat),
+        # per deck, batched over `decks` decks at the default 10k resamples
+        "bootstrap_match_winrate_per_deck_s": timed(lambda: stats_engine.bootstrap_intervals([stats_engine.match_patterns(games)] * decks), args.repeat) / decks,
+        "bootstrap_game_winrate_per_deck_s": timed(lambda: stats_engine.bootstrap_intervals([games] * decks), args.repeat) / decks,
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()